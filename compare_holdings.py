@@ -1,22 +1,25 @@
 SHOW_CANCELED_AND_FAILED_ORDERS = False
+DEFAULT_MAX_AGE_MINUTES = 60  # Saved Robinhood position data older than this is fetched again
+RECONCILE_TOLERANCES = {  # (absolute, relative) differences that positions of each type can have and still match
+    'stock':  {'quantity': (0, 0), 'equity': (0, 0)},
+    'crypto': {'quantity': (0, 0), 'equity': (0, 0)},
+}
 
 
-import pandas as pd
-import io
-import robin_stocks
-import pyotp
-from datetime import datetime as dt
-import json
-import print_control
-from contextlib import redirect_stdout
+import csv
 import os
 import argparse
 import sys
 import time
+from lazy_import import lazy_import
+pd = lazy_import('pandas')  # Loaded when first used, so that --help and argument errors don't wait for it
 
 # Local modules and files:
 import robinhood_process as rh_process
 import robinhood_fetch   as rh_fetch
+import robinhood_snapshot as rh_snapshot
+import robinhood_metrics as rh_metrics
+rh_replay = lazy_import('robinhood_replay')  # Only needed for --record and --replay
 
 
 def parse_and_check_input():
@@ -26,6 +29,22 @@ def parse_and_check_input():
     parser.add_argument('--compare_equity', action='store_true')
     parser.add_argument('--equity_diff', help="If compare_equity is set, then RH orders where equity differences " \
                         "are greater than equity_diff will be displayed.")
+    parser.add_argument('--max_age', type=float, default=DEFAULT_MAX_AGE_MINUTES,
+                        help=f"Reuse saved Robinhood position data if it was fetched less than this many minutes ago. " \
+                        f"Defaults to {DEFAULT_MAX_AGE_MINUTES}.")
+    parser.add_argument('--refresh', action='store_true', help="Always fetch new Robinhood position data.")
+    parser.add_argument('--changed_only', action='store_true', help="Only look up Robinhood orders for tickers whose " \
+                        "positions were opened, closed, or changed quantity since the previous saved position data.")
+    parser.add_argument('--quantity_tolerance', nargs=3, action='append', metavar=('TYPE', 'ABS', 'REL'), default=[],
+                        help="Quantity differences for 'stock' or 'crypto' positions within ABS, plus REL times the " \
+                        "Robinhood quantity, are treated as matching. Can be given once per type.")
+    parser.add_argument('--equity_tolerance', nargs=3, action='append', metavar=('TYPE', 'ABS', 'REL'), default=[],
+                        help="Same as --quantity_tolerance, for equity differences.")
+    parser.add_argument('--metrics_json', help="Write request counts, times, retries, and response sizes for each " \
+                        "Robinhood endpoint to this JSON file at exit.")
+    parser.add_argument('--metrics_prometheus', help="Same as --metrics_json, in Prometheus text format.")
+    parser.add_argument('--record', help="Save every response from Robinhood to this JSON file, to replay later with --replay.")
+    parser.add_argument('--replay', help="Answer requests from a file saved with --record instead of logging in to Robinhood.")
     args = parser.parse_args()
 
     if not os.path.isfile(args.bt_csv_file_path):
@@ -40,25 +59,99 @@ def parse_and_check_input():
         except ValueError:
             sys.exit(f"--equity_diff argument '{args.equity_diff}' is invalid. A floating-point value must be provided.\nExiting.\n")
 
+    try:
+        args.tolerances = get_tolerances([('quantity',) + tuple(tolerance) for tolerance in args.quantity_tolerance] +
+                                         [('equity',)   + tuple(tolerance) for tolerance in args.equity_tolerance])
+    except ValueError as e:
+        sys.exit(f"{e}\nExiting.\n")
+
     return args
 
 
-def process_banktivity_positions_data(bt_holdings_csv_file_path):
+def get_tolerances(tolerance_overrides, tolerances=RECONCILE_TOLERANCES):
+
+    # Returns a copy of tolerances with each (field, type, absolute, relative) override applied, e.g.
+    # ('equity', 'stock', '1', '0.001'). Raises ValueError for an unknown type or values that aren't numbers.
+    tolerances = dict((sec_type, dict(tolerance)) for sec_type, tolerance in tolerances.items())
+    for field, sec_type, absolute_tolerance, relative_tolerance in tolerance_overrides:
+        if sec_type not in tolerances:
+            raise ValueError(f"{field} tolerance type '{sec_type}' is invalid. Use one of: {', '.join(tolerances)}.")
+        try:
+            tolerances[sec_type][field] = (float(absolute_tolerance), float(relative_tolerance))
+        except (TypeError, ValueError):
+            raise ValueError(f"{field} tolerance values '{absolute_tolerance} {relative_tolerance}' are invalid. "
+                             f"Floating-point values must be provided.")
+
+    return tolerances
+
+
+def index_banktivity_sections(bt_csv_file_path):
+
+    # Banktivity exports are made up of sections, each starting with a line holding just the section's title (e.g.
+    # 'Securities'), followed by a header line, a line that isn't needed, and then the data lines. Returns a dictionary
+    # mapping each section title to the index of its title line and its number of non-blank data lines. The file is
+    # read one line at a time, without keeping any of it. Lines are counted the way read_banktivity_section() reads
+    # them: the line after the header is skipped whatever it holds, and read_csv() skips blank data lines.
+    sections = {}
+    section = None
+    skip_next_line = False
+    title_candidate = None  # A line without commas is only a title if a header line follows it
+    with open(bt_csv_file_path, "r") as input_file:
+        for line_idx, line in enumerate(input_file):
+            if skip_next_line:
+                skip_next_line = False
+                continue
+            line = line.strip()
+            if not line:
+                continue
+            if ',' not in line:
+                if title_candidate is not None and section is not None:
+                    section['num_data_lines'] += 1  # The earlier candidate wasn't a title, so it is read as data
+                title_candidate = (line, line_idx)
+                continue
+            if title_candidate is not None:  # This is a header line, starting a new section
+                section_title, title_line_idx = title_candidate
+                section = sections[section_title] = {'title_line_idx': title_line_idx, 'num_data_lines': 0}
+                skip_next_line = True
+                title_candidate = None
+                continue
+            if section is not None:  # Lines before the first section aren't in any section
+                section['num_data_lines'] += 1
+        if title_candidate is not None and section is not None:
+            section['num_data_lines'] += 1
+
+    return sections
+
+
+def read_banktivity_section(bt_csv_file_path, section_title, sections=None, **read_csv_kwargs):
+
+    # Read one section of a Banktivity export into a dataframe. The file handle is moved past the earlier lines and
+    # handed straight to read_csv(), which stops at the end of the section.
+    if sections is None:
+        sections = index_banktivity_sections(bt_csv_file_path)
+    if section_title not in sections:
+        raise ValueError(f"No '{section_title}' section in {bt_csv_file_path}")
+    section = sections[section_title]
+
+    with open(bt_csv_file_path, "r") as input_file:
+        for _ in range(section['title_line_idx'] + 1):
+            input_file.readline()
+        header = input_file.readline()
+        while not header.strip():  # Skip any blank lines after the title
+            header = input_file.readline()
+        input_file.readline()  # Line after the header isn't needed
+        column_names = next(csv.reader([header]))
+        df = pd.read_csv(input_file, sep=",", header=None, names=column_names, nrows=section['num_data_lines'],
+                         **read_csv_kwargs)
+
+    return df
 
-    # Read in file data exported from Banktivity
-    input_file  = open(bt_holdings_csv_file_path, "r")
-    input_lines = input_file.readlines()
-    input_file.close()
 
-    # Find where securities information starts and get data from there
-    securities_line_idx = input_lines.index('Securities\n')
-    file_header = input_lines[securities_line_idx+1]
-    file_data   = input_lines[securities_line_idx+3:]
-    file_data   = ''.join(file_data)
-    data_str    = file_header + file_data
-    data_str    = io.StringIO(data_str)
+def process_banktivity_positions_data(bt_holdings_csv_file_path):
 
-    df = pd.read_csv(data_str, sep=",")
+    df = read_banktivity_section(bt_holdings_csv_file_path, 'Securities',
+                                 usecols=['Symbol', 'Name', 'Close Shares', 'Close Value'],
+                                 dtype={'Symbol': str, 'Name': str})
 
     df = df.set_index('Symbol')
     df.index.names = ['ticker']
@@ -74,19 +167,50 @@ def process_banktivity_positions_data(bt_holdings_csv_file_path):
     return df
 
 
-def compare_holdings_data(df_rh, df_bt):
-    
-    # Get tickers in Robinhood data and in Banktivity data
-    tickers_rh = df_rh.index.tolist()
-    tickers_bt = df_bt.index.tolist()
-    
+def reconcile_holdings(df_rh, df_bt, tolerances=RECONCILE_TOLERANCES):
+
+    # Line up Robinhood and Banktivity positions with a single outer join on ticker. 'source' says which side(s) each
+    # ticker was found in, and 'within_tolerance' is True where both quantity and equity differences are within the
+    # (absolute, relative) tolerances for the position's type. Relative tolerances are fractions of the Robinhood value.
+    df = df_rh.merge(df_bt, how='outer', left_index=True, right_index=True, suffixes=('_rh', '_bt'), indicator='source')
+    df['source'] = df['source'].map({'both': 'both', 'left_only': 'rh_only', 'right_only': 'bt_only'})
+
+    df = df.rename(columns={'quantity_bt': 'bt_quantity', 'quantity_rh': 'rh_quantity', 'quote_bt': 'bt_price',
+                            'quote_rh': 'rh_price', 'equity_bt': 'bt_equity', 'equity_rh': 'rh_equity'})
+    df['type'] = df['type_rh'].where(df['source'] != 'bt_only', df['type_bt'])  # Banktivity doesn't know the type
+    df['name'] = df['name_rh'].where(df['source'] != 'bt_only', df['name_bt'])
+
+    df['quantity_difference'] = df['bt_quantity'] - df['rh_quantity']
+    df['equity_difference']   = pd.to_numeric(df['bt_equity'], errors='coerce') - pd.to_numeric(df['rh_equity'], errors='coerce')
+
+    df['within_tolerance'] = (is_within_tolerance(df, 'quantity', tolerances) & is_within_tolerance(df, 'equity', tolerances))
+
+    df = df[['type', 'name', 'source', 'bt_quantity', 'rh_quantity', 'bt_price', 'rh_price', 'bt_equity', 'rh_equity',
+             'quantity_difference', 'equity_difference', 'within_tolerance']]
+    df.index.name = 'ticker'
+
+    return df
+
+
+def is_within_tolerance(df, field, tolerances):
+
+    absolute_tolerance = df['type'].map(dict((sec_type, tolerance[field][0]) for sec_type, tolerance in tolerances.items())).fillna(0)
+    relative_tolerance = df['type'].map(dict((sec_type, tolerance[field][1]) for sec_type, tolerance in tolerances.items())).fillna(0)
+    rh_values = pd.to_numeric(df[f'rh_{field}'], errors='coerce').abs()
+
+    return df[f'{field}_difference'].abs() <= absolute_tolerance + relative_tolerance * rh_values  # False where a side is missing
+
+
+def compare_holdings_data(df_rh, df_bt, reconciled_df=None):
+
+    # reconciled_df can be passed in if reconcile_holdings() has already been run on df_rh and df_bt
+    if reconciled_df is None:
+        reconciled_df = reconcile_holdings(df_rh, df_bt)
+
     # Find missing tickers
-    missing_from_rh = list(set(tickers_bt).difference(tickers_rh))
-    missing_from_bt = list(set(tickers_rh).difference(tickers_bt))
+    missing_from_rh = df_bt.loc[reconciled_df.index[reconciled_df['source'] == 'bt_only']]
+    missing_from_bt = df_rh.loc[reconciled_df.index[reconciled_df['source'] == 'rh_only']]
 
-    missing_from_rh = df_bt.loc[missing_from_rh]
-    missing_from_bt = df_rh.loc[missing_from_bt]
-    
     # Keep just those rows where quantity or equity is not 0
     missing_from_rh = missing_from_rh.loc[(missing_from_rh['quantity'] != 0) | (missing_from_rh['equity'] != 0)]
     missing_from_bt = missing_from_bt.loc[(missing_from_bt['quantity'] != 0) | (missing_from_bt['equity'] != 0)]
@@ -113,45 +237,45 @@ def parse_and_print_rh_order_data(ticker, order_set):
     
     else:
         for order_idx, order in enumerate(order_set):
-            if ticker != order['symbol']:
-                print(f"ERROR: symbol mismatch: {ticker} != {order['symbol']}, ", sys.exc_info()[0])
+            if ticker != order.symbol:
+                print(f"ERROR: symbol mismatch: {ticker} != {order.symbol}, ", sys.exc_info()[0])
                 raise  # Raise to help debug
 
-            for execution in order['executions']:
-                
-                if ((order['state'] == 'filled') or (SHOW_CANCELED_AND_FAILED_ORDERS)):
-                    num_executions = len(order['executions'])
+            for execution in order.executions:
+
+                if ((order.state == 'filled') or (SHOW_CANCELED_AND_FAILED_ORDERS)):
+                    num_executions = len(order.executions)
 
                     print(f'  {ticker:7s}', end="  ")
-                    print(order['state'], end="  ")
+                    print(order.state, end="  ")
 
-                    side = order['side']
+                    side = order.side
                     print(f'{side:4s}', end="  ")
 
-                    if (order['state'] != 'filled'):
-                        quantity = float(order['quantity'])
+                    if (order.state != 'filled'):
+                        quantity = order.quantity
                     else:
-                        quantity = float(execution['quantity'])
-                    if order['type'] == 'stock':
+                        quantity = execution.quantity
+                    if order.type == 'stock':
                         print(f'{quantity:11,f}', end="  ")
                     else:
                         print(f'{quantity:17,.10f}', end="  ")
 
-                    if order['state'] == 'filled':
+                    if order.state == 'filled':
 
-                        if 'executed_notional' in order:  # Stock order data uses 'executed_notional: amount'
-                            amount = float(order['executed_notional']['amount'])
+                        if order.executed_notional is not None:  # Stock order data uses 'executed_notional: amount'
+                            amount = order.executed_notional
                         else:  # Crypto order data uses 'rounded_executed_notional'
-                            amount = float(order['rounded_executed_notional'])
+                            amount = order.rounded_executed_notional
                         print(f'{amount:8,.2f}', end="  ")
                         
-                        if 'price' in execution:  # Stock order data puts price data in each execution
-                            price =  float(execution['price'])
+                        if execution.price is not None:  # Stock order data puts price data in each execution
+                            price = execution.price
                         else:  # Crypto order data puts price with order data
-                            price = float(order['price'])
+                            price = order.price
                         print(f'{price:12,.3f}', end="  ")
                         
-                        datetime_str = rh_process.format_datetime_str(execution['timestamp'])
+                        datetime_str = rh_process.format_datetime_str(execution.timestamp)
                         print(datetime_str, end="  ")
                         
                         print(num_executions, end="  ")
@@ -190,6 +314,44 @@ def iterate_through_rh_orders(tickers, orders):
         print("There was no order data.")
 
 
+def get_changed_position_tickers(stock_positions_dicts, crypto_positions_dicts):
+
+    # Set of tickers whose positions were opened, closed, or changed quantity since the previous position snapshots, or
+    # None if there aren't previous snapshots to compare with. Changes in equity alone are from price moves, which
+    # orders won't explain, so they are counted but not included.
+    previous_stock_positions_dicts  = rh_snapshot.read_previous_snapshot(rh_process.RH_DATA_JSON_FILE_PATH_STOCKS)
+    previous_crypto_positions_dicts = rh_snapshot.read_previous_snapshot(rh_process.RH_DATA_JSON_FILE_PATH_CRYPTO)
+    if previous_stock_positions_dicts is None or previous_crypto_positions_dicts is None:
+        print("No previous saved position data to compare with. Looking up orders for all tickers.")
+        return None
+
+    diff_df = rh_process.diff_positions(rh_process.get_positions_summary(previous_stock_positions_dicts, previous_crypto_positions_dicts),
+                                        rh_process.get_positions_summary(stock_positions_dicts, crypto_positions_dicts))
+    changed_df = diff_df[diff_df['change'] != 'equity']
+
+    if changed_df.empty:
+        print("No positions were opened, closed, or changed quantity since the previous saved position data.")
+    else:
+        print("Positions changed since the previous saved position data:\n")
+        print(changed_df)
+    print(f"{len(diff_df) - len(changed_df)} other positions only changed in equity.")
+
+    return set(changed_df.index)
+
+
+def keep_changed_tickers(tickers, changed_tickers):
+
+    # The tickers that are in changed_tickers, in the same order, or all of them if changed_tickers is None
+    if changed_tickers is None:
+        return tickers
+
+    kept_tickers = [ticker for ticker in tickers if ticker in changed_tickers]
+    if len(kept_tickers) < len(tickers):
+        print(f"\nSkipping order lookups for {len(tickers) - len(kept_tickers)} tickers whose positions haven't changed.")
+
+    return kept_tickers
+
+
 def cleanup_bt_crypto_tickers(bt_crypto_tickers):
 
     for idx, ticker in enumerate(bt_crypto_tickers):
@@ -199,16 +361,33 @@ def cleanup_bt_crypto_tickers(bt_crypto_tickers):
     return bt_crypto_tickers
 
 
-def compare_equity(df_bt, df_rh):
+def get_quantity_differences(reconciled_df, tolerances=RECONCILE_TOLERANCES):
+
+    # Rows of a reconcile_holdings() dataframe for positions held on both sides whose quantity differs by more than the
+    # quantity tolerance
+    has_quantity_difference = (reconciled_df['quantity_difference'].notna() &
+                               ~is_within_tolerance(reconciled_df, 'quantity', tolerances))
+
+    return reconciled_df[(reconciled_df['source'] == 'both') & has_quantity_difference]
+
+
+def get_equity_differences(reconciled_df, tolerances=RECONCILE_TOLERANCES):
+
+    # Rows of a reconcile_holdings() dataframe for positions held on both sides whose equity differs by more than the
+    # equity tolerance. Quantity differences alone, and equities that couldn't be compared (e.g. no quote), aren't
+    # included.
+    has_equity_difference = (reconciled_df['equity_difference'].notna() &
+                             ~is_within_tolerance(reconciled_df, 'equity', tolerances))
+
+    return reconciled_df[(reconciled_df['source'] == 'both') & has_equity_difference]
 
-    equity_tuples = [(df_rh['type'][ticker], ticker, df_rh['name'][ticker], df_bt['quantity'][ticker], 
-        df_rh['quantity'][ticker], df_bt['quote'][ticker], df_rh['quote'][ticker], df_bt['equity'][ticker], df_rh['equity'][ticker]) for ticker in df_rh.index.tolist()]
-    df = pd.DataFrame(equity_tuples, columns=['type', 'ticker', 'name', 'bt_quantity', 'rh_quantity', 'bt_price', 'rh_price', 'bt_equity', 'rh_equity'])
 
-    df['equity_difference'] = df['bt_equity'] - df['rh_equity']
+def compare_equity(reconciled_df, tolerances=RECONCILE_TOLERANCES):
+
+    df = get_equity_differences(reconciled_df, tolerances)
+    df = df.reset_index()[['type', 'ticker', 'name', 'bt_quantity', 'rh_quantity', 'bt_price', 'rh_price', 'bt_equity', 'rh_equity', 'equity_difference']]
 
     df = df.reindex(df.equity_difference.abs().sort_values(ascending=False).index)  # Sort by absolute value
-    df = df[df.equity_difference.abs() > 0]  # Get rid of rows with no difference
 
     print("Equity differences may be due to after-hours trading. Robinhood prices may be updated through after-hours, "
           "trading while Banktivity prices may only be updated through market close. 'rh_price' below, however, may "
@@ -243,25 +422,46 @@ def main():
 
     # Do setup tasks
     rh_fetch.setup()
+    if args.metrics_json or args.metrics_prometheus:
+        rh_metrics.enable(args.metrics_json, args.metrics_prometheus)
+
+    if args.replay:
+        rh_replay.start_replay(args.replay)
 
-    # Login to Robinhood
+    # Login to Robinhood. Does nothing when replaying.
     rh_fetch.login()
 
-    # Save Robinhood position data to files so that it only needs to be fetched once if script is run multiple times
-    files_exist = os.path.exists(rh_process.RH_DATA_JSON_FILE_PATH_STOCKS) & os.path.exists(rh_process.RH_DATA_JSON_FILE_PATH_CRYPTO)
-    fetch_new_info_input = 'n'
-    if files_exist:
-        fetch_new_info_input = input("Update data from Robinhood? Enter 'y' or 'n': ")
-    if ((not files_exist) or (fetch_new_info_input == 'y')):
-        if (fetch_new_info_input == 'y'):
-            print()
-        rh_process.write_stock_positions_to_json_file(rh_process.RH_DATA_JSON_FILE_PATH_STOCKS)
-        rh_process.write_crypto_positions_to_json_file(rh_process.RH_DATA_JSON_FILE_PATH_CRYPTO)
+    if args.record:
+        rh_replay.start_recording(args.record)  # After logging in, so that tokens aren't saved
+
+    # Save Robinhood position data to files so that it only needs to be fetched again once it is older than max_age
+    max_age_seconds = args.max_age * 60
+    stock_file_path  = None
+    crypto_file_path = None
+    if args.refresh or not rh_snapshot.snapshot_is_fresh(rh_process.RH_DATA_JSON_FILE_PATH_STOCKS, max_age_seconds):
+        stock_file_path = rh_process.RH_DATA_JSON_FILE_PATH_STOCKS
+    else:
+        print(f"Using saved stock position data from {rh_snapshot.get_snapshot_age(rh_process.RH_DATA_JSON_FILE_PATH_STOCKS)/60:.0f} minutes ago.")
+    if args.refresh or not rh_snapshot.snapshot_is_fresh(rh_process.RH_DATA_JSON_FILE_PATH_CRYPTO, max_age_seconds):
+        crypto_file_path = rh_process.RH_DATA_JSON_FILE_PATH_CRYPTO
+    else:
+        print(f"Using saved crypto position data from {rh_snapshot.get_snapshot_age(rh_process.RH_DATA_JSON_FILE_PATH_CRYPTO)/60:.0f} minutes ago.")
+    if stock_file_path or crypto_file_path:
+        rh_process.write_positions_to_json_files(stock_file_path, crypto_file_path)
+
+    stock_positions_dicts  = rh_snapshot.read_snapshot(rh_process.RH_DATA_JSON_FILE_PATH_STOCKS)
+    crypto_positions_dicts = rh_snapshot.read_snapshot(rh_process.RH_DATA_JSON_FILE_PATH_CRYPTO)
+
+    changed_tickers = None  # None looks up orders for every ticker
+    if args.changed_only:
+        print()
+        changed_tickers = get_changed_position_tickers(stock_positions_dicts, crypto_positions_dicts)
 
     df_bt = process_banktivity_positions_data(args.bt_csv_file_path)
-    df_rh = rh_process.process_positions_data(get_quotes=args.compare_equity)
+    df_rh = rh_process.process_positions_data(stock_positions_dicts, crypto_positions_dicts, get_quotes=args.compare_equity)
 
-    [missing_from_rh_df, missing_from_bt_df] = compare_holdings_data(df_rh, df_bt)
+    reconciled_df = reconcile_holdings(df_rh, df_bt, args.tolerances)
+    [missing_from_rh_df, missing_from_bt_df] = compare_holdings_data(df_rh, df_bt, reconciled_df)
     
     stocks_are_missing_from_bt  = False
     cryptos_are_missing_from_bt = False
@@ -289,22 +489,25 @@ def main():
     if tickers_missing_from_bt:
         print("Missing from Banktivity:\n")
         print(missing_from_bt_df)
+
+        order_lookup_tickers_stock  = keep_changed_tickers(tickers_missing_from_bt_stock, changed_tickers)
+        order_lookup_tickers_crypto = keep_changed_tickers(tickers_missing_from_bt_crypto, changed_tickers)
                 
-        if tickers_missing_from_bt_stock:
+        if order_lookup_tickers_stock:
             print("\nGetting missing stock order info... ")
-            rh_stock_orders  = rh_fetch.get_stock_orders(tickers_missing_from_bt_stock)
+            rh_stock_orders  = rh_fetch.get_stock_orders(order_lookup_tickers_stock)
             print("\nRobinhood order data for stock tickers missing from Banktivity:")
-            iterate_through_rh_orders(tickers_missing_from_bt, rh_stock_orders)
+            iterate_through_rh_orders(order_lookup_tickers_stock, rh_stock_orders)
             print()
         else:
             print("\nNo Robinhood stock tickers missing from Banktivity.")
         
-        if tickers_missing_from_bt_crypto:
+        if order_lookup_tickers_crypto:
             print("\nGetting missing crypto order info... ")
-            tickers_missing_from_bt_crypto = cleanup_bt_crypto_tickers(tickers_missing_from_bt_crypto)
-            rh_crypto_orders = rh_fetch.get_crypto_orders(tickers_missing_from_bt_crypto)
+            order_lookup_tickers_crypto = cleanup_bt_crypto_tickers(order_lookup_tickers_crypto)
+            rh_crypto_orders = rh_fetch.get_crypto_orders(order_lookup_tickers_crypto)
             print("Robinhood order data for crypto tickers missing from Banktivity:")
-            iterate_through_rh_orders(tickers_missing_from_bt_crypto, rh_crypto_orders)
+            iterate_through_rh_orders(order_lookup_tickers_crypto, rh_crypto_orders)
         else:
             print("\nNo Robinhood crypto tickers missing from Banktivity.")
     
@@ -326,16 +529,22 @@ def main():
 
     print("\n--------------------------------------------------------------------------------\n")
 
-    if args.compare_equity:
+    # Display positions held in both whose quantities don't match
+    quantity_diff_df = get_quantity_differences(reconciled_df, args.tolerances)
+    if not quantity_diff_df.empty:
+        print("Quantity differences:\n")
+        print(quantity_diff_df[['type', 'name', 'bt_quantity', 'rh_quantity', 'quantity_difference']])
+    else:
+        print("No quantity differences.")
 
-        # Remove missing tickers from dfs before comparing equity
-        if tickers_missing_from_rh:
-            df_bt.drop(tickers_missing_from_rh, inplace=True)
-        if tickers_missing_from_bt:
-            df_rh.drop(tickers_missing_from_bt, inplace=True)
+    print("\n--------------------------------------------------------------------------------\n")
+
+    if args.compare_equity:
 
-        equity_diff_df = compare_equity(df_bt, df_rh)
+        equity_diff_df = compare_equity(reconciled_df, args.tolerances)  # Only positions in both are compared
         [equity_diff_tickers_stock, equity_diff_tickers_crypto] = get_equity_diff_tickers(equity_diff_df, args.equity_diff)
+        equity_diff_tickers_stock  = keep_changed_tickers(equity_diff_tickers_stock, changed_tickers)
+        equity_diff_tickers_crypto = keep_changed_tickers(equity_diff_tickers_crypto, changed_tickers)
 
         if equity_diff_tickers_stock:        
             print(f"\nGetting stock order info for stock tickers where absolute value equity differences are greater than or equal to ${args.equity_diff}... ")
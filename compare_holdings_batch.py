@@ -0,0 +1,166 @@
+DEFAULT_NUM_PROCESSES = 4
+REPORT_NUMERIC_COLUMNS = ['quantity', 'quote', 'equity', 'bt_quantity', 'rh_quantity', 'bt_price', 'rh_price', 'bt_equity',
+                          'rh_equity', 'quantity_difference', 'equity_difference']
+
+
+import io
+import os
+import sys
+import json
+import asyncio
+import argparse
+import multiprocessing
+from contextlib import redirect_stdout
+from datetime import datetime as dt
+import functools
+print = functools.partial(print, flush=True)  # Prevent print statements from buffering till end of execution
+from lazy_import import lazy_import
+pd = lazy_import('pandas')  # Loaded when first used, so that --help and argument errors don't wait for it
+
+# Local modules and files:
+import compare_holdings
+import robinhood_process     as rh_process
+import robinhood_fetch       as rh_fetch
+import robinhood_fetch_async as rh_fetch_async
+
+
+# Reconciles several Robinhood accounts against their Banktivity exports in one run. The manifest is a JSON list with an
+# entry for each account, e.g.:
+#
+#   [{"name": "Individual", "bt_csv_file_path": "individual.csv"},
+#    {"name": "Joint", "profile": "joint", "bt_csv_file_path": "joint.csv",
+#     "tolerances": {"stock": {"equity": [1, 0.001]}}}]
+#
+# 'profile' names an entry in the 'profiles' dictionary in robinhood_creds.py; without it, the top-level credentials are
+# used. 'tolerances' gives (absolute, relative) tolerances by type and field, as in compare_holdings.py's
+# --quantity_tolerance and --equity_tolerance, for that account on top of those given on the command line. Each account is handled in a separate process, so one account's login and errors can't affect another's.
+
+
+def parse_and_check_input():
+
+    parser = argparse.ArgumentParser(description='Reconcile several Robinhood accounts with what Banktivity is tracking, '
+                                     'and write the results to a JSON report.')
+    parser.add_argument('manifest_file_path', help="Path to JSON file listing the accounts to reconcile.")
+    parser.add_argument('report_file_path', help="Path to write the JSON report to.")
+    parser.add_argument('--compare_equity', action='store_true', help="Get quotes and also report equity differences.")
+    parser.add_argument('--quantity_tolerance', nargs=3, action='append', metavar=('TYPE', 'ABS', 'REL'), default=[],
+                        help="Quantity differences for 'stock' or 'crypto' positions within ABS, plus REL times the "
+                        "Robinhood quantity, are treated as matching. Can be given once per type.")
+    parser.add_argument('--equity_tolerance', nargs=3, action='append', metavar=('TYPE', 'ABS', 'REL'), default=[],
+                        help="Same as --quantity_tolerance, for equity differences.")
+    parser.add_argument('--processes', '-p', type=int, default=DEFAULT_NUM_PROCESSES,
+                        help=f"Number of accounts to reconcile at a time. Defaults to {DEFAULT_NUM_PROCESSES}.")
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.manifest_file_path):
+        sys.exit(f"Manifest file '{args.manifest_file_path}' does not exist.\nExiting.\n")
+
+    try:
+        with open(args.manifest_file_path, "r") as manifest_file:
+            args.accounts = json.load(manifest_file)
+    except ValueError as e:
+        sys.exit(f"Manifest file '{args.manifest_file_path}' is not valid JSON: {e}\nExiting.\n")
+
+    try:
+        tolerances = compare_holdings.get_tolerances([('quantity',) + tuple(tolerance) for tolerance in args.quantity_tolerance] +
+                                                     [('equity',)   + tuple(tolerance) for tolerance in args.equity_tolerance])
+    except ValueError as e:
+        sys.exit(f"{e}\nExiting.\n")
+
+    for account in args.accounts:
+        if 'bt_csv_file_path' not in account:
+            sys.exit(f"Manifest entry {account} has no 'bt_csv_file_path'.\nExiting.\n")
+        if not os.path.isfile(account['bt_csv_file_path']):
+            sys.exit(f"Input file '{account['bt_csv_file_path']}' does not exist.\nExiting.\n")
+        account.setdefault('profile', None)
+        account.setdefault('name', account['profile'] or account['bt_csv_file_path'])
+        try:
+            account['tolerances'] = compare_holdings.get_tolerances(
+                [(field, sec_type, *tolerance) for sec_type, field_tolerances in account.get('tolerances', {}).items()
+                                               for field, tolerance in field_tolerances.items()],
+                tolerances)
+        except (ValueError, TypeError, AttributeError) as e:
+            sys.exit(f"Manifest entry '{account['name']}' has invalid tolerances: {e}\nExiting.\n")
+
+    return args
+
+
+def df_to_records(df):
+
+    # Robinhood stock quotes are strings, so prices, quantities, and equities are made numeric so that the report has
+    # the same types for stocks and crypto. Values that aren't numbers (e.g. no quote) become null. to_json() writes NaN
+    # as null, which json.dumps() would write as the invalid JSON value NaN.
+    df = df.reset_index()
+    for column in df.columns.intersection(REPORT_NUMERIC_COLUMNS):
+        df[column] = pd.to_numeric(df[column], errors='coerce')
+
+    return json.loads(df.to_json(orient='records'))
+
+
+def reconcile_account(account, compare_equity=False):
+
+    # Runs in a worker process. Output that would normally be printed is kept in the report instead.
+    report = {'name': account['name'], 'profile': account['profile'], 'bt_csv_file_path': account['bt_csv_file_path']}
+    output = io.StringIO()
+
+    try:
+        with redirect_stdout(output):
+            rh_fetch.setup()
+            rh_fetch.login(account['profile'])
+            stock_positions, crypto_positions = asyncio.run(rh_fetch_async.get_positions_dicts())
+
+            df_rh = rh_process.process_positions_data(stock_positions, crypto_positions, get_quotes=compare_equity)
+            df_bt = compare_holdings.process_banktivity_positions_data(account['bt_csv_file_path'])
+
+            reconciled_df = compare_holdings.reconcile_holdings(df_rh, df_bt, account['tolerances'])
+            [missing_from_rh_df, missing_from_bt_df] = compare_holdings.compare_holdings_data(df_rh, df_bt, reconciled_df)
+
+        report['status'] = 'ok'
+        report['missing_from_rh'] = df_to_records(missing_from_rh_df)
+        report['missing_from_bt'] = df_to_records(missing_from_bt_df)
+        report['quantity_differences'] = df_to_records(compare_holdings.get_quantity_differences(reconciled_df, account['tolerances']))
+        if compare_equity:
+            report['equity_differences'] = df_to_records(compare_holdings.get_equity_differences(reconciled_df, account['tolerances']))
+
+    except Exception as e:
+        report['status'] = 'error'
+        report['error'] = f"{type(e).__name__}: {e}"
+
+    report['log'] = output.getvalue()
+
+    return report
+
+
+def main():
+
+    print()
+
+    args = parse_and_check_input()
+
+    print(f"Reconciling {len(args.accounts)} accounts... ", end="")
+    # A fresh process for each account, so no login state is shared between accounts
+    with multiprocessing.Pool(processes=args.processes, maxtasksperchild=1) as pool:
+        account_reports = pool.map(functools.partial(reconcile_account, compare_equity=args.compare_equity), args.accounts)
+    print("Done.\n")
+
+    for account_report in account_reports:
+        if account_report['status'] == 'ok':
+            print(f"  {account_report['name']}: {len(account_report['missing_from_bt'])} missing from Banktivity, "
+                  f"{len(account_report['missing_from_rh'])} missing from Robinhood, "
+                  f"{len(account_report['quantity_differences'])} quantity differences")
+        else:
+            print(f"  {account_report['name']}: ERROR: {account_report['error']}")
+
+    report = {'generated_at': dt.now().isoformat(timespec='seconds'), 'accounts': account_reports}
+
+    print(f"\nWriting report to {args.report_file_path} file... ", end="")
+    with open(args.report_file_path, "w") as report_file:
+        json.dump(report, report_file, indent=2)
+    print("Done.")
+
+
+if __name__ == "__main__":
+
+    main()
+
+    print("\nDone. Exiting.\n")
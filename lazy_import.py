@@ -0,0 +1,22 @@
+import sys
+import importlib.util
+
+
+def lazy_import(module_name):
+
+    # Returns the module without running it. It is loaded the first time one of its attributes is used, so that modules
+    # which are slow to import (e.g. pandas, robin_stocks) don't slow down runs that never use them, like --help or an
+    # argument error. Later imports of the same module get this module object too.
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+
+    spec = importlib.util.find_spec(module_name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{module_name}'", name=module_name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    loader.exec_module(module)
+
+    return module
@@ -0,0 +1,299 @@
+BENCHMARK_EXECUTION_COUNTS = [1000, 10000, 100000, 500000]
+FAKE_ACCOUNT_SIZES = {'small':  {'num_positions': 50,  'num_orders': 2000,  'num_dividends': 500,  'num_crypto': 5},
+                      'medium': {'num_positions': 200, 'num_orders': 10000, 'num_dividends': 2000, 'num_crypto': 10},
+                      'large':  {'num_positions': 500, 'num_orders': 50000, 'num_dividends': 5000, 'num_crypto': 20}}
+DEFAULT_FAKE_ACCOUNT_SIZES = ['small', 'medium']
+REGRESSION_THRESHOLD = 1.25  # Times slower than the baseline that counts as a regression
+STARTUP_SCRIPTS = ['robinhood_process.py', 'compare_holdings.py']
+STARTUP_DEFERRED_MODULES = ['pandas', 'numpy', 'robin_stocks', 'requests', 'dateutil.parser', 'pyotp']  # Must not be imported for --help
+DEFAULT_STARTUP_RUNS = 5
+
+
+import io
+import os
+import sys
+import json
+import asyncio
+import argparse
+import random
+import tempfile
+import time
+import subprocess
+from contextlib import redirect_stdout
+import functools
+print = functools.partial(print, flush=True)  # Prevent print statements from buffering till end of execution
+
+# Local modules and files:
+import robinhood_process     as rh_process
+import robinhood_lots        as rh_lots
+import robinhood_orders      as rh_orders
+import robinhood_fetch       as rh_fetch
+import robinhood_fetch_async as rh_fetch_async
+import robinhood_fake_api    as rh_fake_api
+import compare_holdings
+
+
+def make_synthetic_stock_orders(num_executions, num_tickers=50, seed=0):
+
+    # Build order dicts shaped like those Robinhood returns, grouped into one order set per ticker, and parse them into
+    # the records robinhood_fetch.get_stock_orders() returns. Orders have between one and four executions so that every
+    # amount selection rule gets exercised.
+    rng = random.Random(seed)
+    tickers = [f"T{ticker_idx:03d}" for ticker_idx in range(num_tickers)]
+    order_sets = dict((ticker, []) for ticker in tickers)
+
+    executions_made = 0
+    while executions_made < num_executions:
+        ticker = rng.choice(tickers)
+        num_order_executions = min(rng.randint(1, 4), num_executions - executions_made)
+        price = rng.uniform(1, 500)
+
+        executions = []
+        for execution_idx in range(num_order_executions):
+            quantity = rng.randint(1, 100)
+            rounded_notional = f"{price * quantity:.2f}" if rng.random() < 0.9 else None
+            executions.append({'price':            f"{price:.6f}",
+                               'quantity':         f"{quantity:.5f}",
+                               'rounded_notional': rounded_notional,
+                               'timestamp':        f"2020-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T"
+                                                   f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00.000000Z"})
+
+        total_notional = sum(float(execution['price']) * float(execution['quantity']) for execution in executions)
+        order_sets[ticker].append({'symbol':            ticker,
+                                   'state':             'filled' if rng.random() < 0.95 else 'cancelled',
+                                   'type':              rng.choice(['market', 'limit']),
+                                   'side':              rng.choice(['buy', 'sell']),
+                                   'fees':              f"{rng.choice([0, 0, 0, 0.02]):.2f}",
+                                   'executed_notional': {'amount': f"{total_notional:.2f}", 'currency_code': 'USD'},
+                                   'executions':        executions})
+        executions_made += num_order_executions
+
+    return rh_orders.parse_order_sets(order_sets.values())
+
+
+def time_call(func, *args):
+
+    start_time = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start_time
+
+    return result, elapsed
+
+
+def time_quiet_call(func, *args):
+
+    # time_call(), without the status messages printed by the fetch functions and compare_holdings.py
+    with redirect_stdout(io.StringIO()):
+        return time_call(func, *args)
+
+
+def benchmark_process_stock_order_data(execution_counts, results):
+
+    print("Benchmarking process_stock_order_data():\n")
+    print(f"  {'executions':>10s}  {'rows':>10s}  {'seconds':>9s}  {'rows/sec':>12s}")
+    for num_executions in execution_counts:
+        stock_orders = make_synthetic_stock_orders(num_executions)
+        order_df, elapsed = time_call(rh_process.process_stock_order_data, stock_orders)
+        results[f"process_stock_order_data/{num_executions}"] = elapsed
+        print(f"  {num_executions:10,d}  {len(order_df):10,d}  {elapsed:9.3f}  {len(order_df) / elapsed:12,.0f}")
+
+
+def benchmark_qif_writer(execution_counts, results):
+
+    print("\nBenchmarking write_stock_order_records_to_qif():\n")
+    print(f"  {'records':>10s}  {'seconds':>9s}  {'records/sec':>12s}")
+    for num_executions in execution_counts:
+        stock_orders_df = rh_process.process_stock_order_data(make_synthetic_stock_orders(num_executions))
+        order_records = stock_orders_df.itertuples(index=False, name=None)
+        with open(os.devnull, 'w') as qif_file:
+            _, elapsed = time_call(rh_process.write_stock_order_records_to_qif, order_records, qif_file)
+        results[f"write_stock_order_records_to_qif/{num_executions}"] = elapsed
+        print(f"  {len(stock_orders_df):10,d}  {elapsed:9.3f}  {len(stock_orders_df) / elapsed:12,.0f}")
+
+
+def benchmark_fake_account(account_size, results):
+
+    # Run the tools end to end against the fake Robinhood API, from fetching through writing output files. Files are
+    # written to a temporary directory, which is also where the caches and saved position data end up.
+    account = rh_fake_api.FakeAccount(**FAKE_ACCOUNT_SIZES[account_size])
+    api = rh_fake_api.install(account)
+    symbols = [instrument['symbol'] for instrument in account.instruments]
+
+    print(f"\nBenchmarking against a fake {account_size} account ({', '.join(f'{count:,d} {name[4:]}' for name, count in FAKE_ACCOUNT_SIZES[account_size].items())}):\n")
+    print(f"  {'step':<34s}  {'seconds':>9s}")
+
+    working_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        os.chdir(temp_dir)
+        try:
+            steps = []
+            (stock_positions, crypto_positions), elapsed = time_quiet_call(asyncio.run, rh_fetch_async.get_positions_dicts())
+            steps.append(('fetch positions', elapsed))
+            _, elapsed = time_quiet_call(rh_process.process_positions_data, stock_positions, crypto_positions, True)
+            steps.append(('process_positions_data', elapsed))
+            stock_orders, elapsed = time_quiet_call(rh_fetch.get_stock_orders, symbols)
+            steps.append(('fetch stock orders', elapsed))
+            _, elapsed = time_quiet_call(rh_process.process_stock_order_data, stock_orders)
+            steps.append(('process_stock_order_data', elapsed))
+            _, elapsed = time_quiet_call(rh_process.write_stock_orders_outputs, stock_orders, [('table', 'orders.csv')])
+            steps.append(('write orders CSV', elapsed))
+            _, elapsed = time_quiet_call(rh_process.write_stock_orders_outputs, stock_orders, [('qif', 'orders.qif')])
+            steps.append(('write orders QIF', elapsed))
+            stock_dividends, elapsed = time_quiet_call(rh_fetch.get_stock_dividends_dicts)
+            steps.append(('fetch dividends', elapsed))
+            _, elapsed = time_quiet_call(rh_process.write_stock_dividends_outputs, stock_dividends, [('table', 'dividends.csv')])
+            steps.append(('write dividends CSV', elapsed))
+
+            rh_fake_api.write_banktivity_csv_file(account, 'banktivity.csv')
+            argv = sys.argv
+            sys.argv = ['compare_holdings.py', 'banktivity.csv', '--refresh', '--compare_equity', '--equity_diff', '1']
+            try:
+                _, elapsed = time_quiet_call(compare_holdings.main)
+            finally:
+                sys.argv = argv
+            steps.append(('compare_holdings end to end', elapsed))
+        finally:
+            os.chdir(working_dir)
+
+    for step, elapsed in steps:
+        results[f"{account_size}/{step}"] = elapsed
+        print(f"  {step:<34s}  {elapsed:9.3f}")
+    print(f"\n  {api.num_requests:,d} requests made to the fake API")
+
+
+def get_startup_imports(script_file_path):
+
+    # Run the script with --help under 'python -X importtime', which reports each module imported on stderr as
+    # 'import time: <self us> | <cumulative us> | <indented module name>'. Returns the wall time, the total import time,
+    # and the names of the modules imported.
+    start_time = time.perf_counter()
+    process = subprocess.run([sys.executable, '-X', 'importtime', script_file_path, '--help'], capture_output=True,
+                             text=True, cwd=os.path.dirname(script_file_path))
+    elapsed = time.perf_counter() - start_time
+
+    import_seconds = 0
+    module_names = []
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, module_name = line[len('import time:'):].split('|')
+        if not module_name[1:].startswith(' '):  # Top-level imports, the others are included in these
+            import_seconds += int(cumulative_us) / 1e6
+        module_names.append(module_name.strip())
+
+    return elapsed, import_seconds, module_names
+
+
+def benchmark_startup(num_runs, results):
+
+    # Time how long the scripts take to start up, using --help so that nothing is fetched. Heavy modules are only
+    # imported by the code paths that need them, so returns a list of any of STARTUP_DEFERRED_MODULES that were imported.
+    print(f"\nBenchmarking startup with --help ({num_runs} runs each):\n")
+    print(f"  {'script':<24s}  {'seconds':>9s}  {'import seconds':>14s}")
+    problems = []
+    for script in STARTUP_SCRIPTS:
+        script_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), script)
+        runs = [get_startup_imports(script_file_path) for _ in range(num_runs)]
+        elapsed, import_seconds, module_names = min(runs)  # Fastest run, the others were slowed by something else
+        results[f"startup/{script}"] = elapsed
+        print(f"  {script:<24s}  {elapsed:9.3f}  {import_seconds:14.3f}")
+        for module_name in STARTUP_DEFERRED_MODULES:
+            if module_name in module_names:
+                problems.append(f"{script} imports {module_name}")
+
+    return problems
+
+
+def compare_to_baseline(results, baseline_file_path, threshold=REGRESSION_THRESHOLD):
+
+    # Returns the names of the benchmarks that took more than threshold times as long as they did in the baseline
+    with open(baseline_file_path, "r") as baseline_file:
+        baseline = json.load(baseline_file)
+
+    print(f"\nCompared to {baseline_file_path}:\n")
+    print(f"  {'benchmark':<48s}  {'baseline':>9s}  {'seconds':>9s}  {'ratio':>6s}")
+    regressions = []
+    for name, elapsed in results.items():
+        if name not in baseline:
+            continue
+        ratio = elapsed / baseline[name] if baseline[name] else float('inf')
+        is_regression = ratio > threshold
+        if is_regression:
+            regressions.append(name)
+        print(f"  {name:<48s}  {baseline[name]:9.3f}  {elapsed:9.3f}  {ratio:6.2f}{'  REGRESSION' if is_regression else ''}")
+
+    return regressions
+
+
+def benchmark_lot_tables(execution_counts, results):
+
+    print("\nBenchmarking robinhood_lots.get_lot_tables():\n")
+    print(f"  {'method':>8s}  {'executions':>10s}  {'lots sold':>10s}  {'seconds':>9s}  {'executions/sec':>14s}")
+    for num_executions in execution_counts:
+        stock_orders_df = rh_process.process_stock_order_data(make_synthetic_stock_orders(num_executions))
+        for method in rh_lots.LOT_METHODS:
+            (realized_df, _), elapsed = time_call(rh_lots.get_lot_tables, stock_orders_df, method)
+            results[f"get_lot_tables/{method}/{num_executions}"] = elapsed
+            print(f"  {method:>8s}  {len(stock_orders_df):10,d}  {len(realized_df):10,d}  {elapsed:9.3f}  {len(stock_orders_df) / elapsed:14,.0f}")
+
+
+def parse_and_check_input():
+
+    parser = argparse.ArgumentParser(description='Time robinhood_process functions against synthetic Robinhood data, '
+                                     'and the tools end to end against a fake Robinhood API.')
+    parser.add_argument('--executions', '-n', nargs='+', type=int, default=BENCHMARK_EXECUTION_COUNTS,
+                        help='Space-separated list of synthetic execution counts to benchmark with.')
+    parser.add_argument('--account_sizes', '-a', nargs='*', choices=list(FAKE_ACCOUNT_SIZES), default=DEFAULT_FAKE_ACCOUNT_SIZES,
+                        help=f"Fake account sizes to run end to end benchmarks with. Defaults to {' '.join(DEFAULT_FAKE_ACCOUNT_SIZES)}. "
+                        "Give the option with no sizes to skip them.")
+    parser.add_argument('--startup_runs', type=int, default=DEFAULT_STARTUP_RUNS,
+                        help=f"Number of times to start each script when timing startup. Defaults to {DEFAULT_STARTUP_RUNS}. Use 0 to skip.")
+    parser.add_argument('--json', help='Write the benchmark times to this JSON file, to use as a baseline later.')
+    parser.add_argument('--baseline', help='JSON file written by an earlier run with --json. Exits with an error if any '
+                        f'benchmark takes more than {REGRESSION_THRESHOLD} times as long as it did then.')
+    args = parser.parse_args()
+
+    if args.baseline and not os.path.isfile(args.baseline):
+        sys.exit(f"Baseline file '{args.baseline}' does not exist.\nExiting.\n")
+
+    return args
+
+
+def main():
+
+    print()
+
+    args = parse_and_check_input()
+
+    rh_fetch.setup()
+
+    results = {}
+    benchmark_process_stock_order_data(args.executions, results)
+    benchmark_qif_writer(args.executions, results)
+    benchmark_lot_tables(args.executions, results)
+    for account_size in args.account_sizes:
+        benchmark_fake_account(account_size, results)
+    startup_problems = []
+    if args.startup_runs > 0:
+        startup_problems = benchmark_startup(args.startup_runs, results)
+
+    if args.json:
+        print(f"\nWriting benchmark times to {args.json} file... ", end="")
+        with open(args.json, "w") as json_file:
+            json.dump(results, json_file, indent=2)
+        print("Done.")
+
+    if startup_problems:
+        sys.exit(f"\nModules that should only be imported when needed were imported at startup: {', '.join(startup_problems)}\nExiting.\n")
+
+    if args.baseline:
+        regressions = compare_to_baseline(results, args.baseline)
+        if regressions:
+            sys.exit(f"\n{len(regressions)} benchmarks regressed: {', '.join(regressions)}\nExiting.\n")
+
+
+if __name__ == '__main__':
+
+    main()
+
+    print("\nDone.\nExiting.\n")
@@ -0,0 +1,98 @@
+import os
+import json
+import time
+import tempfile
+import threading
+
+
+FILE_LOCKS = {}  # One lock per cache file, so that caches on the same file in this process save one at a time
+FILE_LOCKS_LOCK = threading.Lock()
+
+
+def get_file_lock(file_path):
+
+    with FILE_LOCKS_LOCK:
+        return FILE_LOCKS.setdefault(os.path.abspath(file_path), threading.RLock())
+
+
+class FileCache:
+  # Small key/value cache persisted to a JSON file. Each entry stores the time it was set so that entries older than
+  # ttl_seconds are treated as missing, and the oldest entries are evicted once there are more than max_entries. An
+  # instance can be shared by threads. Saving merges in entries written to the file by others since it was loaded.
+
+  def __init__(self, file_path, ttl_seconds=None, max_entries=None):
+    self.file_path   = file_path
+    self.ttl_seconds = ttl_seconds
+    self.max_entries = max_entries
+    self.entries     = {}
+    self.modified    = False
+    self.lock        = get_file_lock(file_path)
+    self.load()
+
+  def read_file(self):
+    if not os.path.exists(self.file_path):
+      return {}
+    try:
+      with open(self.file_path, "r") as cache_file:
+        return json.load(cache_file)
+    except (ValueError, OSError):
+      return {}  # Unreadable or corrupt cache, start over
+
+  def load(self):
+    with self.lock:
+      self.entries = self.read_file()
+      self.evict()
+
+  def save(self):
+    with self.lock:
+      if not self.modified:
+        return
+      for key, entry in self.read_file().items():  # Keep entries saved by other caches on the same file, newest wins
+        if key not in self.entries or entry[0] > self.entries[key][0]:
+          self.entries[key] = entry
+      self.evict()
+
+      # Written to a uniquely named file and renamed over the cache, which is atomic, so an interrupted run can't
+      # leave a half-written cache and saves running at the same time can't use the same temporary file
+      file_dir, file_name = os.path.split(os.path.abspath(self.file_path))
+      temp_fd, temp_file_path = tempfile.mkstemp(prefix=file_name + ".", suffix=".tmp", dir=file_dir)
+      try:
+        with os.fdopen(temp_fd, "w") as cache_file:
+          json.dump(self.entries, cache_file)
+        os.replace(temp_file_path, self.file_path)
+      except BaseException:
+        os.remove(temp_file_path)
+        raise
+      self.modified = False
+
+  def is_expired(self, entry, now):
+    return self.ttl_seconds is not None and now - entry[0] > self.ttl_seconds
+
+  def evict(self):
+    now = time.time()
+    expired_keys = [key for key, entry in self.entries.items() if self.is_expired(entry, now)]
+    for key in expired_keys:
+      del self.entries[key]
+
+    if self.max_entries is not None and len(self.entries) > self.max_entries:
+      keys_oldest_first = sorted(self.entries, key=lambda key: self.entries[key][0])
+      for key in keys_oldest_first[:len(self.entries) - self.max_entries]:
+        del self.entries[key]
+
+    if expired_keys:
+      self.modified = True
+
+  def get(self, key, default=None):
+    with self.lock:
+      entry = self.entries.get(key)
+    if entry is None or self.is_expired(entry, time.time()):
+      return default
+    return entry[1]
+
+  def set(self, key, value):
+    with self.lock:
+      self.entries[key] = [time.time(), value]
+      self.modified = True
+
+  def __contains__(self, key):
+    return self.get(key) is not None
@@ -1,3 +1,7 @@
 username  = 'username'
 password  = 'password'
-TOTP_code = 'TOTP_code'
\ No newline at end of file
+TOTP_code = 'TOTP_code'
+
+# Credentials for other accounts, used by compare_holdings_batch.py. Ex:
+# profiles = {'joint': {'username': 'username', 'password': 'password', 'TOTP_code': 'TOTP_code'}}
+profiles = {}
@@ -0,0 +1,95 @@
+DIVIDEND_INCOME_STATES = ['paid', 'reinvested']  # Pending dividends aren't income yet, and voided ones never will be
+TRAILING_MONTHS = 12
+
+
+from lazy_import import lazy_import
+pd = lazy_import('pandas')
+
+# Local modules and files:
+import robinhood_output as rh_output
+
+
+# Dividend income summaries, from the dataframe made by robinhood_process.process_stock_dividends_data(). Robinhood
+# returns every number as a string, so the columns are cast once by prepare_dividends_df() and everything after that is
+# done with groupby and resample rather than row by row.
+
+
+def prepare_dividends_df(stock_dividends_df):
+
+    # Cast the columns, keep only dividends that were paid, and add the date each was paid and its amount after
+    # withholding. Dividends without a paid_at time use their payable date.
+    df = rh_output.apply_dtypes(stock_dividends_df, rh_output.STOCK_DIVIDEND_DTYPES)
+    if 'state' in df.columns:
+        df = df[df['state'].isin(DIVIDEND_INCOME_STATES)]
+
+    date = df['paid_at']
+    if 'payable_date' in df.columns:
+        date = date.fillna(pd.to_datetime(df['payable_date'], utc=True))
+    total_withholding = df['withholding'].fillna(0) + df['nra_withholding'].fillna(0)
+
+    df = df.assign(symbol=df['symbol'].astype(str), date=date, total_withholding=total_withholding,
+                   net_amount=df['amount'] - total_withholding)
+
+    return df
+
+
+def get_dividends_by_symbol(dividends_df, stock_positions_dicts=None, as_of=None):
+
+    # One row per symbol with its totals, its income over the trailing 12 months up to as_of (default now), and, when
+    # positions are given, its yield on cost: trailing 12 month income as a percentage of what the position cost
+    if as_of is None:
+        as_of = pd.Timestamp.now(tz='UTC')
+    is_trailing = dividends_df['date'] > as_of - pd.DateOffset(months=TRAILING_MONTHS)
+    df = dividends_df.assign(ttm_amount=dividends_df['amount'].where(is_trailing, 0.0),
+                             ttm_net_amount=dividends_df['net_amount'].where(is_trailing, 0.0))
+
+    by_symbol_df = df.groupby('symbol').agg(num_dividends=('amount', 'size'),
+                                            amount=('amount', 'sum'),
+                                            withholding=('total_withholding', 'sum'),
+                                            net_amount=('net_amount', 'sum'),
+                                            ttm_amount=('ttm_amount', 'sum'),
+                                            ttm_net_amount=('ttm_net_amount', 'sum'),
+                                            first_paid=('date', 'min'),
+                                            last_paid=('date', 'max'))
+
+    if stock_positions_dicts is not None:
+        cost_basis = pd.Series(dict((symbol, float(position['quantity']) * float(position['average_buy_price']))
+                                    for symbol, position in stock_positions_dicts.items()), dtype='float64')
+        by_symbol_df['cost_basis'] = cost_basis.reindex(by_symbol_df.index)  # NaN for positions that have been sold
+        by_symbol_df['yield_on_cost'] = by_symbol_df['ttm_amount'] * 100 / by_symbol_df['cost_basis'].where(by_symbol_df['cost_basis'] > 0)
+
+    rounded_columns = [column for column in by_symbol_df.columns if column not in ['num_dividends', 'first_paid', 'last_paid']]
+    by_symbol_df = by_symbol_df.sort_values('amount', ascending=False).round(dict.fromkeys(rounded_columns, 2))  # Cents, and hundredths of a percent
+
+    return by_symbol_df
+
+
+def get_dividends_by_month(dividends_df):
+
+    # One row per calendar month, including months without dividends, with that month's totals and the totals for the 12
+    # months ending with it
+    df = dividends_df.set_index('date')[['amount', 'total_withholding', 'net_amount']]
+    by_month_df = df.resample('MS').sum()
+    by_month_df.insert(0, 'num_dividends', df['amount'].resample('MS').count())
+    by_month_df = by_month_df.rename(columns={'total_withholding': 'withholding'})
+    by_month_df['ttm_amount']     = by_month_df['amount'].rolling(TRAILING_MONTHS, min_periods=1).sum()
+    by_month_df['ttm_net_amount'] = by_month_df['net_amount'].rolling(TRAILING_MONTHS, min_periods=1).sum()
+
+    by_month_df = by_month_df.round(2)
+    by_month_df.index = by_month_df.index.tz_localize(None)
+    by_month_df.index.name = 'month'
+
+    return by_month_df
+
+
+def get_dividend_totals(dividends_df, as_of=None):
+
+    if as_of is None:
+        as_of = pd.Timestamp.now(tz='UTC')
+    is_trailing = dividends_df['date'] > as_of - pd.DateOffset(months=TRAILING_MONTHS)
+
+    return {'amount':         dividends_df['amount'].sum(),
+            'withholding':    dividends_df['total_withholding'].sum(),
+            'net_amount':     dividends_df['net_amount'].sum(),
+            'ttm_amount':     dividends_df.loc[is_trailing, 'amount'].sum(),
+            'ttm_net_amount': dividends_df.loc[is_trailing, 'net_amount'].sum()}
@@ -0,0 +1,274 @@
+FAKE_API_PAGE_SIZE = 100  # Results per page of paginated endpoints, like Robinhood
+FAKE_ACCOUNT_START_DATE = '2018-01-02'
+
+
+import random
+import threading
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit, parse_qs, urlencode
+import requests
+
+# Local modules and files:
+import robinhood_session as rh_session
+import robinhood_replay as rh_replay
+
+
+# A local stand-in for the parts of the Robinhood API used here, serving a synthetic account, so that the tools can be
+# run and timed without credentials or a network connection. FakeRobinhoodAPI answers requests for a FakeAccount the way
+# Robinhood would, and install() mounts it on robin_stocks' shared requests session. Responses only have the fields
+# that robinhood_fetch and robin_stocks use.
+
+
+API_URL    = 'https://api.robinhood.com'
+NUMMUS_URL = 'https://nummus.robinhood.com'
+
+
+def make_id(rng):
+
+    return '-'.join(''.join(rng.choice('0123456789abcdef') for _ in range(num_chars)) for num_chars in [8, 4, 4, 4, 12])
+
+
+def format_timestamp(timestamp):
+
+    return timestamp.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+class FakeAccount:
+  # Synthetic positions, orders (some with several executions), dividends and crypto. Orders are also made for tickers
+  # that are no longer held, as happens in real accounts. The same arguments always make the same account.
+
+  def __init__(self, num_positions=50, num_orders=2000, num_dividends=500, num_crypto=5, seed=0):
+    rng = random.Random(seed)
+    self.instruments = []
+    self.positions   = []
+    self.quotes      = {}
+    for ticker_idx in range(num_positions + num_positions//5 + 1):  # Extra instruments for closed positions
+      instrument_id = make_id(rng)
+      symbol        = f"S{ticker_idx:04d}"
+      self.instruments.append({'id':          instrument_id,
+                               'url':         f"{API_URL}/instruments/{instrument_id}/",
+                               'symbol':      symbol,
+                               'name':        f"Synthetic Company {ticker_idx} Inc.",
+                               'simple_name': f"Synthetic {ticker_idx}" if rng.random() < 0.9 else None,
+                               'type':        rng.choice(['stock', 'stock', 'stock', 'etp', 'adr'])})
+      self.quotes[symbol] = {'symbol':                          symbol,
+                             'last_trade_price':                f"{rng.uniform(1, 500):.6f}",
+                             'last_extended_hours_trade_price': f"{rng.uniform(1, 500):.6f}" if rng.random() < 0.5 else None,
+                             'instrument':                      self.instruments[-1]['url']}
+    for instrument in self.instruments[:num_positions]:
+      self.positions.append({'url':               f"{API_URL}/positions/{make_id(rng)}/",
+                             'instrument':        instrument['url'],
+                             'quantity':          f"{rng.randint(1, 1000):.5f}",
+                             'average_buy_price': f"{rng.uniform(1, 500):.4f}"})
+    self.instruments_by_id     = dict((instrument['id'], instrument) for instrument in self.instruments)
+    self.instruments_by_symbol = dict((instrument['symbol'], instrument) for instrument in self.instruments)
+
+    self.orders = self.make_stock_orders(rng, num_orders)
+    self.dividends = self.make_dividends(rng, num_dividends, num_positions)
+
+    self.currency_pairs = []
+    self.crypto_quotes  = {}
+    self.crypto_holdings = [{'currency': {'code': 'USD', 'name': 'US Dollar'}, 'quantity': '0.000000000000000000'}]
+    for crypto_idx in range(num_crypto):
+      code = f"C{crypto_idx:02d}"
+      pair = {'id': make_id(rng), 'symbol': f"{code}-USD", 'name': f"Synthetic Coin {crypto_idx}",
+              'asset_currency': {'code': code, 'name': f"Synthetic Coin {crypto_idx}"}}
+      self.currency_pairs.append(pair)
+      self.crypto_quotes[pair['id']] = {'id': pair['id'], 'symbol': f"{code}USD",
+                                        'ask_price': f"{rng.uniform(0.01, 50000):.6f}",
+                                        'bid_price': f"{rng.uniform(0.01, 50000):.6f}"}
+      self.crypto_holdings.append({'id': make_id(rng), 'currency': pair['asset_currency'],
+                                   'quantity': f"{rng.uniform(0.001, 100):.18f}"})
+    self.crypto_orders = self.make_crypto_orders(rng, num_orders // 10)
+
+  def make_stock_orders(self, rng, num_orders):
+    orders = []
+    timestamp = datetime.fromisoformat(FAKE_ACCOUNT_START_DATE)
+    for _ in range(num_orders):
+      timestamp += timedelta(minutes=rng.randint(1, 600))
+      instrument = rng.choice(self.instruments)
+      price = float(self.quotes[instrument['symbol']]['last_trade_price']) * rng.uniform(0.5, 1.5)
+      executions = []
+      for execution_idx in range(rng.choice([1, 1, 1, 2, 3, 4])):
+        quantity = rng.randint(1, 100)
+        executions.append({'id':               make_id(rng),
+                           'price':            f"{price:.6f}",
+                           'quantity':         f"{quantity:.5f}",
+                           'rounded_notional': f"{price * quantity:.2f}" if rng.random() < 0.9 else None,
+                           'timestamp':        format_timestamp(timestamp + timedelta(seconds=execution_idx))})
+      quantity = sum(float(execution['quantity']) for execution in executions)
+      state = rng.choices(['filled', 'cancelled', 'failed'], weights=[90, 8, 2])[0]
+      if state != 'filled':
+        executions = []
+      order_id = make_id(rng)
+      orders.append({'id':                  order_id,
+                     'url':                 f"{API_URL}/orders/{order_id}/",
+                     'instrument':          instrument['url'],
+                     'state':               state,
+                     'side':                rng.choice(['buy', 'sell']),
+                     'type':                rng.choice(['market', 'limit']),
+                     'quantity':            f"{quantity:.5f}",
+                     'cumulative_quantity': f"{quantity if executions else 0:.5f}",
+                     'price':               f"{price:.6f}",
+                     'average_price':       f"{price:.6f}" if executions else None,
+                     'fees':                f"{rng.choice([0, 0, 0, 0.02]):.2f}",
+                     'executed_notional':   {'amount': f"{price * quantity:.2f}", 'currency_code': 'USD'} if executions else None,
+                     'created_at':          format_timestamp(timestamp),
+                     'updated_at':          format_timestamp(timestamp + timedelta(seconds=len(executions))),
+                     'executions':          executions})
+    orders.reverse()  # Newest first, like Robinhood
+
+    return orders
+
+  def make_dividends(self, rng, num_dividends, num_positions):
+    dividends = []
+    paid_date = datetime.fromisoformat(FAKE_ACCOUNT_START_DATE)
+    for _ in range(num_dividends):
+      paid_date += timedelta(hours=rng.randint(1, 72))
+      instrument = self.instruments[rng.randrange(max(num_positions, 1))]
+      position = rng.randint(1, 1000)
+      rate = rng.uniform(0.01, 2)
+      withholding = rate * position * 0.1 if rng.random() < 0.1 else 0
+      dividends.append({'id':              make_id(rng),
+                        'instrument':      instrument['url'],
+                        'amount':          f"{rate * position:.2f}",
+                        'rate':            f"{rate:.8f}",
+                        'position':        f"{position:.5f}",
+                        'withholding':     f"{withholding:.2f}",
+                        'nra_withholding': '0',
+                        'record_date':     (paid_date - timedelta(days=14)).strftime('%Y-%m-%d'),
+                        'payable_date':    paid_date.strftime('%Y-%m-%d'),
+                        'paid_at':         format_timestamp(paid_date),
+                        'state':           'paid',
+                        'drip_enabled':    rng.random() < 0.3})
+
+    return dividends
+
+  def make_crypto_orders(self, rng, num_orders):
+    orders = []
+    if not self.currency_pairs:
+      return orders
+    timestamp = datetime.fromisoformat(FAKE_ACCOUNT_START_DATE)
+    for _ in range(num_orders):
+      timestamp += timedelta(minutes=rng.randint(1, 6000))
+      pair = rng.choice(self.currency_pairs)
+      price = float(self.crypto_quotes[pair['id']]['ask_price']) * rng.uniform(0.5, 1.5)
+      quantity = rng.uniform(0.001, 10)
+      orders.append({'id':                        make_id(rng),
+                     'currency_pair_id':          pair['id'],
+                     'state':                     'filled' if rng.random() < 0.95 else 'canceled',
+                     'side':                      rng.choice(['buy', 'sell']),
+                     'type':                      rng.choice(['market', 'limit']),
+                     'quantity':                  f"{quantity:.8f}",
+                     'price':                     f"{price:.2f}",
+                     'rounded_executed_notional': f"{price * quantity:.2f}",
+                     'created_at':                format_timestamp(timestamp),
+                     'updated_at':                format_timestamp(timestamp),
+                     'executions':                [{'quantity': f"{quantity:.8f}", 'timestamp': format_timestamp(timestamp)}]})
+    orders.reverse()
+
+    return orders
+
+
+class FakeRobinhoodAPI(requests.adapters.BaseAdapter):
+  # requests adapter that answers GET requests from a FakeAccount
+
+  def __init__(self, account):
+    super().__init__()
+    self.account       = account
+    self.num_requests  = 0
+    self.lock          = threading.Lock()
+
+  def send(self, request, **kwargs):
+    with self.lock:
+      self.num_requests += 1
+    parts = urlsplit(request.url)
+    url = f"{parts.scheme}://{parts.netloc}{parts.path}"
+    params = dict((key, values[0]) for key, values in parse_qs(parts.query).items())
+    try:
+      data = self.get(url, params) if request.method == 'GET' else None
+    except KeyError:
+      data = None
+    if data is None:
+      return rh_replay.make_response(request, 404, {'detail': 'Not found.'})
+    return rh_replay.make_response(request, 200, data)
+
+  def close(self):
+    pass
+
+  def get(self, url, params):
+    account = self.account
+    path_parts = url.rstrip('/').split('/')
+    if url == f"{API_URL}/positions/":
+      return self.paginate(url, params, account.positions)
+    elif url == f"{API_URL}/instruments/" and 'ids' in params:
+      return {'results': [account.instruments_by_id.get(instrument_id) for instrument_id in params['ids'].split(',')]}
+    elif url == f"{API_URL}/instruments/" and 'symbol' in params:
+      instrument = account.instruments_by_symbol.get(params['symbol'])
+      return {'results': [instrument] if instrument else []}
+    elif url.startswith(f"{API_URL}/instruments/"):
+      return account.instruments_by_id[path_parts[-1]]
+    elif url == f"{API_URL}/quotes/":
+      return {'results': [account.quotes.get(symbol) for symbol in params['symbols'].split(',')]}
+    elif url == f"{API_URL}/dividends/":
+      return self.paginate(url, params, account.dividends)
+    elif url == f"{API_URL}/orders/":
+      orders = account.orders
+      if 'updated_at[gte]' in params:
+        orders = [order for order in orders if order['updated_at'] >= params['updated_at[gte]']]
+      if 'instrument' in params:
+        orders = [order for order in orders if order['instrument'] == params['instrument']]
+      return self.paginate(url, params, orders)
+    elif url.startswith(f"{API_URL}/marketdata/forex/quotes/"):
+      return account.crypto_quotes[path_parts[-1]]
+    elif url == f"{NUMMUS_URL}/holdings/":
+      return self.paginate(url, params, account.crypto_holdings)
+    elif url == f"{NUMMUS_URL}/currency_pairs/":
+      return {'results': account.currency_pairs, 'next': None}
+    elif url == f"{NUMMUS_URL}/orders/":
+      return self.paginate(url, params, account.crypto_orders)
+    return None
+
+  def paginate(self, url, params, results):
+    # Offset-based, with the offset in a 'cursor' parameter like Robinhood's next page URLs
+    offset = int(params.pop('cursor', 0))
+    next_offset = offset + FAKE_API_PAGE_SIZE
+    next_url = None
+    if next_offset < len(results):
+      next_url = f"{url}?{urlencode(dict(params, cursor=next_offset))}"
+    return {'results': results[offset:next_offset], 'next': next_url, 'previous': None}
+
+
+def install(account=None):
+
+    # Point all Robinhood requests at a fake API for account, made with the default arguments if not given
+    if account is None:
+        account = FakeAccount()
+    api = FakeRobinhoodAPI(account)
+    rh_session.use_offline_adapter(api)
+
+    return api
+
+
+def write_banktivity_csv_file(account, output_file_path, num_differences=5, seed=0):
+
+    # Write a Banktivity export with the account's stock positions, with a few positions changed or left out, so that
+    # compare_holdings.py has differences to report
+    rng = random.Random(seed)
+    instruments = dict((instrument['url'], instrument) for instrument in account.instruments)
+    lines = ["Securities", "Symbol,Name,Close Shares,Close Value", ",,,"]
+    for position_idx, position in enumerate(account.positions):
+        instrument = instruments[position['instrument']]
+        quantity = float(position['quantity'])
+        if position_idx < num_differences:
+            continue  # Missing from Banktivity
+        if position_idx < 2*num_differences:
+            quantity += rng.randint(1, 10)
+        value = quantity * float(account.quotes[instrument['symbol']]['last_trade_price'])
+        lines.append(f"{instrument['symbol']},\"{instrument['name']}\",{quantity},{value:.2f}")
+    for holding in account.crypto_holdings[1:]:
+        lines.append(f"{holding['currency']['code']}USDT,\"{holding['currency']['name']}\",{float(holding['quantity'])},0.00")
+    lines.append(f"BTONLY,\"Only in Banktivity\",1,1.00")
+
+    with open(output_file_path, "w") as output_file:
+        output_file.write('\n'.join(lines) + '\n')
@@ -1,11 +1,31 @@
-import sys
+INSTRUMENT_SYMBOL_CACHE_FILE_PATH = "robinhood_instrument_symbols.json"
+INSTRUMENT_SYMBOL_CACHE_TTL_SECONDS = 30*24*60*60  # Symbols rarely change for an instrument, but they can (e.g. after a merger)
+INSTRUMENT_SYMBOL_CACHE_MAX_ENTRIES = 10000
+SYMBOL_LOOKUP_MAX_WORKERS = 8
+STOCK_QUOTE_BATCH_SIZE = 100  # Number of symbols to request quotes for per request
+INSTRUMENT_BATCH_SIZE = 100  # Number of instruments to request per request
+CRYPTO_QUOTE_MAX_WORKERS = 8
+ORDER_STORE_BATCH_SIZE = 500  # Number of synced orders to save to the order store at a time
+FULL_HISTORY_SYMBOL_THRESHOLD = 3  # Above this many symbols, download the order history once rather than once per symbol
+STREAMED_ORDER_BATCH_SIZE = 500  # Number of streamed orders to look up instrument symbols for at a time
+
+
 import os
-import pyotp
-import robin_stocks
-import json
+import itertools
 import robinhood_creds as rh_creds
 import functools
+import threading
 print = functools.partial(print, flush=True)  # Prevent print statements from buffering till end of execution
+from concurrent.futures import ThreadPoolExecutor
+from lazy_import import lazy_import
+robin_stocks = lazy_import('robin_stocks')
+
+# Local modules and files:
+from robinhood_cache import FileCache
+from robinhood_order_store import OrderStore
+import robinhood_scheduler as rh_scheduler
+import robinhood_session as rh_session
+import robinhood_orders as rh_orders
 
 
 def setup():
@@ -13,21 +33,91 @@ def setup():
     robin_stocks.helper.set_output(open(os.devnull,"w"))
 
 
-def login():
+def login(profile=None):
+
+    username, password, totp_code = get_credentials(profile)
+    rh_session.login(username, password, totp_code)
+
 
-    totp  = pyotp.TOTP(rh_creds.TOTP_code).now()
-    login = robin_stocks.login(rh_creds.username, rh_creds.password, mfa_code=totp)
+def get_credentials(profile=None):
+
+    # Without a profile, use the top-level credentials in robinhood_creds.py. Otherwise use the credentials for that
+    # profile from its 'profiles' dictionary.
+    if profile is None:
+        return rh_creds.username, rh_creds.password, rh_creds.TOTP_code
+
+    profiles = getattr(rh_creds, 'profiles', {})
+    if profile not in profiles:
+        raise ValueError(f"No credentials profile named '{profile}' in robinhood_creds.py")
+
+    return profiles[profile]['username'], profiles[profile]['password'], profiles[profile]['TOTP_code']
 
 
 def get_stock_positions_dicts():
 
-    print("Getting stock positions from Robinhood. This may take a few minutes... ", end="")
-    stock_positions = robin_stocks.account.build_holdings(with_dividends=True)
+    # Returns a dictionary keyed by symbol, like robin_stocks.account.build_holdings(), but with only the fields that
+    # are used here. build_holdings() makes several requests for every position (instrument, quote, fundamentals, name)
+    # plus the whole dividend history, while this gets positions, instruments and quotes with a few batched requests.
+    print("Getting stock positions from Robinhood... ", end="")
+    positions = list(iterate_paginated_results(robin_stocks.urls.positions(), {'nonzero': 'true'}))
+    instruments = get_instruments_by_urls([position['instrument'] for position in positions])
+
+    # Like build_holdings(), leave out positions whose instrument can't be found rather than failing on all of them
+    for position in positions:
+        if position['instrument'] not in instruments:
+            print(f"\nWARNING: Could not get the instrument for position {position['instrument']}. Leaving it out.")
+    positions = [position for position in positions if position['instrument'] in instruments]
+    symbols = [instruments[position['instrument']]['symbol'] for position in positions]
+
+    # The quote endpoint returns null for some symbols, e.g. halted or delisted ones. Their equity is figured at their
+    # average buy price so that they are still reconciled. A quote batch that fails raises from get_stock_quotes(), so
+    # a failed request fails the fetch instead of being mistaken for missing quotes.
+    prices = get_stock_quotes(symbols, include_extended_hours=True)
+    unquoted_symbols = []
+    for position, symbol in zip(positions, symbols):
+        if prices.get(symbol) is None:
+            prices[symbol] = position['average_buy_price']
+            unquoted_symbols.append(symbol)
+
+    equities = [float(position['quantity']) * float(prices[symbol]) for position, symbol in zip(positions, symbols)]
+    total_equity = sum(equities)
+
+    stock_positions = {}
+    for position, symbol, equity in zip(positions, symbols, equities):
+        instrument = instruments[position['instrument']]
+        stock_positions[symbol] = {'price':             prices[symbol],
+                                   'quantity':          position['quantity'],
+                                   'average_buy_price': position['average_buy_price'],
+                                   'equity':            f"{equity:.2f}",
+                                   'percentage':        f"{equity * 100 / total_equity:.2f}" if total_equity else "0.00",
+                                   'type':              instrument['type'],
+                                   'name':              instrument['simple_name'] or instrument['name'],
+                                   'id':                instrument['id']}
     print("Done.")
 
+    if unquoted_symbols:
+        print(f"\nWARNING: Robinhood returned no quote for {', '.join(unquoted_symbols)}. The equity shown for "
+              f"{'it' if len(unquoted_symbols) == 1 else 'them'} is at the average buy price, not the market price.\n")
+
     return stock_positions
 
 
+def get_instruments_by_urls(instrument_urls):
+
+    # Returns a dictionary mapping each instrument URL to its instrument data, requesting many instruments at a time
+    instrument_ids = list(dict.fromkeys(url.rstrip('/').split('/')[-1] for url in instrument_urls))
+
+    instruments = {}
+    for batch_start in range(0, len(instrument_ids), INSTRUMENT_BATCH_SIZE):
+        id_batch = instrument_ids[batch_start:batch_start+INSTRUMENT_BATCH_SIZE]
+        page = rh_scheduler.call_with_retry(get_page, robin_stocks.urls.instruments(), {'ids': ','.join(id_batch)})
+        for instrument in page['results']:
+            if instrument is not None:
+                instruments[instrument['url']] = instrument
+
+    return instruments
+
+
 def get_crypto_positions_dicts():
 
     print("Getting crypto positions from Robinhood... ", end="")    
@@ -40,87 +130,413 @@ def get_crypto_positions_dicts():
 def get_stock_dividends_dicts():
 
     print("Getting stock dividends from Robinhood... ", end="")
-    stock_dividends = robin_stocks.account.get_dividends()
+    stock_dividends = list(iterate_paginated_results(robin_stocks.urls.dividends()))
     print("Done.")
 
-    print("Getting symbols for dividends from Robinhood. This may take a few miniutes... ", end="")
-    for div_idx, dividend in enumerate(stock_dividends):
-        stock_dividends[div_idx]['symbol'] = robin_stocks.stocks.get_symbol_by_url(stock_dividends[div_idx]['instrument'])
+    print("Getting symbols for dividends from Robinhood... ", end="")
+    instrument_symbols = get_symbols_by_instrument_urls([dividend['instrument'] for dividend in stock_dividends])
+    for dividend in stock_dividends:
+        dividend['symbol'] = instrument_symbols[dividend['instrument']]
     print("Done.")
 
     return stock_dividends
 
 
+INSTRUMENT_SYMBOL_CACHE = None  # Shared by every fetch, see get_instrument_symbol_cache()
+INSTRUMENT_SYMBOL_CACHE_LOCK = threading.Lock()
+
+
+def get_instrument_symbol_cache():
+
+    # One cache for the whole run, since orders and dividends can be fetched at the same time and both look up symbols
+    global INSTRUMENT_SYMBOL_CACHE
+    with INSTRUMENT_SYMBOL_CACHE_LOCK:
+        if INSTRUMENT_SYMBOL_CACHE is None:
+            INSTRUMENT_SYMBOL_CACHE = FileCache(INSTRUMENT_SYMBOL_CACHE_FILE_PATH, INSTRUMENT_SYMBOL_CACHE_TTL_SECONDS,
+                                                INSTRUMENT_SYMBOL_CACHE_MAX_ENTRIES)
+
+    return INSTRUMENT_SYMBOL_CACHE
+
+
+def get_symbols_by_instrument_urls(instrument_urls, get_symbol_by_url=None, cache=None):
+
+    # Returns a dictionary mapping each instrument URL to its symbol. Each unique URL is only looked up once, URLs seen
+    # on earlier runs come from the on-disk cache, and the remaining lookups are done concurrently.
+    if get_symbol_by_url is None:
+        get_symbol_by_url = robin_stocks.stocks.get_symbol_by_url
+    if cache is None:
+        cache = get_instrument_symbol_cache()
+
+    unique_urls = list(dict.fromkeys(instrument_urls))  # Remove duplicates, preserving order
+    instrument_symbols = dict((url, cache.get(url)) for url in unique_urls)
+    uncached_urls = [url for url, symbol in instrument_symbols.items() if symbol is None]
+
+    if uncached_urls:
+        with ThreadPoolExecutor(max_workers=SYMBOL_LOOKUP_MAX_WORKERS) as executor:
+            symbols = executor.map(get_symbol_by_url, uncached_urls)
+            for url, symbol in zip(uncached_urls, symbols):
+                instrument_symbols[url] = symbol
+                if symbol:  # Don't cache failed lookups
+                    cache.set(url, symbol)
+        cache.save()
+
+    return instrument_symbols
+
+
+def get_stock_quotes(symbols, include_extended_hours=False):
+
+    # Returns a dictionary mapping each symbol to its last trade price, or its last extended hours trade price if there
+    # is one and include_extended_hours is set. Quotes are requested for many symbols at a time instead of one request
+    # per symbol. robin_stocks.stocks.get_quotes() hides HTTP errors, so a batch that failed would look like a batch of
+    # invalid symbols. Batches are requested with get_page() instead, so that failures are retried and then raised.
+    stock_quotes = {}
+    symbols = list(dict.fromkeys(symbol.upper().strip() for symbol in symbols))
+
+    for batch_start in range(0, len(symbols), STOCK_QUOTE_BATCH_SIZE):
+        symbol_batch = symbols[batch_start:batch_start+STOCK_QUOTE_BATCH_SIZE]
+        page = rh_scheduler.call_with_retry(get_page, robin_stocks.urls.quotes(), {'symbols': ','.join(symbol_batch)})
+        for quote in page['results']:
+            if quote is None:  # None is returned for invalid symbols
+                continue
+            if include_extended_hours and quote['last_extended_hours_trade_price'] is not None:
+                stock_quotes[quote['symbol']] = quote['last_extended_hours_trade_price']
+            else:
+                stock_quotes[quote['symbol']] = quote['last_trade_price']
+
+    return stock_quotes
+
+
+def get_crypto_quotes(symbols):
+
+    # Returns a dictionary mapping each symbol to its ask price. Robinhood has no multi-symbol crypto quote request, so
+    # the requests are made concurrently.
+    unique_symbols = list(dict.fromkeys(symbols))
+
+    with ThreadPoolExecutor(max_workers=CRYPTO_QUOTE_MAX_WORKERS) as executor:
+        ask_prices = executor.map(lambda symbol: robin_stocks.crypto.get_crypto_quote(symbol, 'ask_price'), unique_symbols)
+        crypto_quotes = dict(zip(unique_symbols, ask_prices))
+
+    return crypto_quotes
+
+
 def get_stock_orders(symbols):
-    
-    # print_controller = print_control.Controller()
-    # print_controller.disable_printing()
-    
-    # import os
-    # import sys
-    # f = open(os.devnull, 'w')
-    # # sys.stdout = f
 
-    # contextlib.redirect_stdout(f)
+    # Returns a list with the orders for each symbol, as robinhood_orders.Order records, in the same order as symbols.
+    # Each symbol costs an instrument lookup plus at least one page of orders, so for more than a few symbols it is
+    # faster to download the whole order history once and split it up here.
+    if len(symbols) > FULL_HISTORY_SYMBOL_THRESHOLD:
+        orders = get_stock_orders_from_full_history(symbols)
+    else:
+        orders = get_stock_orders_per_symbol(symbols)
 
-    # f = io.StringIO()
-    # with redirect_stdout(f):
+    for symbol, order_set in zip(symbols, orders):
+        for order in order_set:
+            order['symbol'] = symbol
 
-    #     orders = [robin_stocks.orders.find_stock_orders(symbol=symbol) for symbol in tickers]
-    
-    #     print(f)
+    return rh_orders.parse_order_sets(orders)
+
+
+def get_stock_orders_per_symbol(symbols):
+
+    results = rh_scheduler.run_in_pool(get_stock_orders_for_symbol, symbols)
+
+    orders = []
+    failed_symbols = []
+    for symbol, (order_set, exception) in zip(symbols, results):
+        if exception is not None:
+            print(f"\nERROR: Could not get orders for '{symbol}': {exception}")
+        elif order_set is None:
+            print(f"\nERROR: Could not get orders for '{symbol}'. Make sure that it is a valid symbol.")
+        if order_set is None:
+            failed_symbols.append(symbol)
+            order_set = []
+        orders.append(order_set)
+
+    if failed_symbols:
+        print(f"\nNo order data was retrieved for: {', '.join(failed_symbols)}\n")
+
+    return orders
+
+
+def get_stock_orders_for_symbol(symbol):
+
+    # Get the orders for one symbol, or None if no instrument has that symbol. robin_stocks' find_stock_orders()
+    # downloads every order through request_get(), which hides HTTP errors, so request the instrument's orders with
+    # get_page() instead. A rate limit or server error then raises, and run_in_pool() retries the symbol.
+    instrument_url = get_instrument_url_by_symbol(symbol)
+    if instrument_url is None:
+        return None
 
     orders = []
+    page = get_page(robin_stocks.urls.orders(), {'instrument': instrument_url})
+    while page is not None:
+        orders.extend(page['results'])
+        page = get_page(page['next']) if page.get('next') else None
+
+    return orders
+
+
+def get_stock_orders_from_full_history(symbols):
+
+    orders = partition_stock_orders_by_symbol(iterate_stock_orders(), symbols)
+
+    return orders
+
+
+def partition_stock_orders_by_symbol(all_orders, symbols):
+
+    # Partition orders by instrument, then only look up symbols for the instruments that were actually traded
+    instrument_orders = {}
+    for order in all_orders:
+        instrument_orders.setdefault(order['instrument'], []).append(order)
+    instrument_symbols = get_symbols_by_instrument_urls(list(instrument_orders))
+
+    symbol_orders = dict((symbol.upper(), []) for symbol in symbols)
+    for instrument_url, order_set in instrument_orders.items():
+        symbol = instrument_symbols[instrument_url]
+        if symbol in symbol_orders:
+            symbol_orders[symbol].extend(order_set)
+
+    orders = [symbol_orders[symbol.upper()] for symbol in symbols]
+
+    report_unknown_symbols([symbol for symbol, order_set in zip(symbols, orders) if not order_set])
+
+    return orders
+
+
+def iterate_stock_order_sets(symbols):
 
+    # Same orders as get_stock_orders(), but yielded a batch at a time as they are downloaded, rather than grouped by
+    # symbol once all of them are, so the whole history never has to be held in memory. Each batch is a list of
+    # robinhood_orders.Order records, in fetched order. As in get_stock_orders(), a few symbols are requested one at a
+    # time and more are split out of the whole order history.
+    if len(symbols) > FULL_HISTORY_SYMBOL_THRESHOLD:
+        order_sets = iterate_stock_order_sets_from_full_history(symbols)
+    else:
+        order_sets = iterate_stock_order_sets_per_symbol(symbols)
+
+    for order_set in order_sets:
+        yield rh_orders.parse_order_sets([order_set])[0]
+
+
+def iterate_stock_order_sets_per_symbol(symbols):
+
+    unknown_symbols = []
     for symbol in symbols:
-        try:
-            order_set = robin_stocks.orders.find_stock_orders(symbol=symbol)
-        except IndexError as e:
-            sys.exit(f"\nERROR: IndexError encountered. Make sure that all symbols are valid.\n\nExiting.\n")
+        instrument_url = rh_scheduler.call_with_retry(get_instrument_url_by_symbol, symbol)
+        if instrument_url is None:
+            unknown_symbols.append(symbol)
+            continue
+
+        symbol_orders = iterate_paginated_results(robin_stocks.urls.orders(), {'instrument': instrument_url})
+        for order_set in iterate_batches(symbol_orders, STREAMED_ORDER_BATCH_SIZE):
+            for order in order_set:
+                order['symbol'] = symbol
+            yield order_set
+
+    print_unknown_symbols(unknown_symbols)
+
+
+def iterate_stock_order_sets_from_full_history(symbols):
+
+    given_symbols = dict((symbol.upper(), symbol) for symbol in symbols)
+    traded_symbols = set()
+    instrument_symbols = {}
+
+    for orders in iterate_batches(iterate_stock_orders(), STREAMED_ORDER_BATCH_SIZE):
+        new_instrument_urls = [order['instrument'] for order in orders if order['instrument'] not in instrument_symbols]
+        instrument_symbols.update(get_symbols_by_instrument_urls(new_instrument_urls))
+
+        order_set = []
+        for order in orders:
+            symbol = instrument_symbols[order['instrument']]
+            if symbol in given_symbols:
+                order['symbol'] = given_symbols[symbol]
+                order_set.append(order)
+                traded_symbols.add(symbol)
+        yield order_set
+
+    report_unknown_symbols([symbol for symbol in symbols if symbol.upper() not in traded_symbols])
+
+
+def iterate_batches(iterable, batch_size):
+
+    # Yield lists of up to batch_size items, taken from iterable as each list is needed
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def report_unknown_symbols(untraded_symbols):
+
+    # A symbol with no orders may just not have been traded, so check that it is a real symbol before reporting it
+    results = rh_scheduler.run_in_pool(get_instrument_url_by_symbol, untraded_symbols)
+    print_unknown_symbols([symbol for symbol, (instrument_url, exception) in zip(untraded_symbols, results)
+                           if instrument_url is None and exception is None])
+
+
+def print_unknown_symbols(unknown_symbols):
+
+    for symbol in unknown_symbols:
+        print(f"\nERROR: Could not get orders for '{symbol}'. Make sure that it is a valid symbol.")
+    if unknown_symbols:
+        print(f"\nNo order data was retrieved for: {', '.join(unknown_symbols)}\n")
+
+
+def get_instrument_url_by_symbol(symbol):
+
+    # None if no instrument has the symbol
+    instruments = get_page(robin_stocks.urls.instruments(), {'symbol': symbol.upper()})['results']
+
+    return instruments[0]['url'] if instruments else None
+
+
+def sync_stock_orders(order_store):
+
+    # Download only the orders created or changed since the last sync and save them to the local order store. An open
+    # order gets a new 'updated_at' when it fills or is canceled, so it is picked up again by a later sync. The cursor
+    # is inclusive so that orders updated in the same instant as the last one seen aren't missed.
+    cursor = order_store.get_cursor('stock')
+
+    if cursor is None:
+        print("Downloading full stock order history from Robinhood. This may take a few minutes... ", end="")
+        new_orders = iterate_stock_orders()
+    else:
+        print(f"Downloading stock orders updated since {cursor} from Robinhood... ", end="")
+        new_orders = iterate_stock_orders({'updated_at[gte]': cursor})
+
+    # Save orders in batches as pages arrive. Orders come newest first, so the cursor is only moved once they're all saved.
+    num_new_orders = 0
+    latest_updated_at = ''
+    batch = []
+    for order in new_orders:
+        batch.append(order)
+        latest_updated_at = max(latest_updated_at, order['updated_at'])
+        if len(batch) == ORDER_STORE_BATCH_SIZE:
+            order_store.save_orders(batch, 'stock', update_cursor=False)
+            num_new_orders += len(batch)
+            batch = []
+    order_store.save_orders(batch, 'stock', update_cursor=False)
+    num_new_orders += len(batch)
+    if latest_updated_at:
+        order_store.update_cursor(latest_updated_at, 'stock')
+    print(f"Done. {num_new_orders} new or updated orders.")
+
+
+def get_stock_orders_from_store(symbols, order_store_path, sync=True):
+
+    # Same as get_stock_orders(), but orders come from the local order store, which is first brought up to date
+    with OrderStore(order_store_path) as order_store:
+        if sync:
+            sync_stock_orders(order_store)
+
+        instrument_symbols = get_symbols_by_instrument_urls(order_store.get_instruments('stock'))
+        wanted_symbols = set(symbol.upper() for symbol in symbols)
+        wanted_instruments = [url for url, symbol in instrument_symbols.items() if symbol in wanted_symbols]
+        stored_orders = order_store.get_orders('stock', wanted_instruments)
+
+    orders = partition_stock_orders_by_symbol(stored_orders, symbols)
+    for symbol, order_set in zip(symbols, orders):
         for order in order_set:
             order['symbol'] = symbol
-        orders.append(order_set)
 
-    # print_controller.enable_printing()
-    
-    return orders
+    return rh_orders.parse_order_sets(orders)
 
 
 def get_all_crypto_orders():
-    
-    orders = robin_stocks.orders.get_all_crypto_orders()
+
+    orders = list(iterate_crypto_orders())
 
     return orders
 
 
+def iterate_stock_orders(payload=None):
+
+    return iterate_paginated_results(robin_stocks.urls.orders(), payload)
+
+
+def iterate_crypto_orders():
+
+    return iterate_paginated_results(robin_stocks.urls.order_crypto())
+
+
+def get_page(url, payload=None):
+
+    # robin_stocks.helper.request_get() hides HTTP errors, so make the request directly to let call_with_retry() see
+    # rate limiting and server errors
+    response = robin_stocks.helper.SESSION.get(url, params=payload)
+    response.raise_for_status()
+
+    return response.json()
+
+
+def iterate_paginated_results(url, payload=None):
+
+    # Yield the results from each page of a paginated endpoint. Each page gives the URL of the next one, so pages can't
+    # be fetched out of order, but the next page is fetched in the background while the results of the current one are
+    # being consumed. At most two pages are held in memory at a time.
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        page = rh_scheduler.call_with_retry(get_page, url, payload)
+        while page is not None:
+            next_page_future = None
+            if page.get('next'):
+                next_page_future = executor.submit(rh_scheduler.call_with_retry, get_page, page['next'])
+
+            for result in page['results']:
+                yield result
+
+            page = next_page_future.result() if next_page_future is not None else None
+
+
 def get_crypto_orders(symbols=None):
-    
-    all_orders = get_all_crypto_orders()
-    
-    if symbols is None:
-        wanted_orders = all_orders
-        # TODO: Do for all orders what we do for wanted orders below
 
-    elif symbols == []:
+    all_orders = iterate_crypto_orders()
+
+    if symbols == []:
         return []
-    
+
+    pair_symbols = get_crypto_pair_symbols()
+
+    if symbols is None:
+        order_dict = {}  # Filled in below with a key for every symbol there is an order for
     else:
         order_dict = dict((symbol, []) for symbol in symbols)  # Create dictionary with each symbol as a key
-             
-        for order in all_orders:
-            symbol = get_crypto_order_symbol(order['currency_pair_id'])
-            order['symbol'] = symbol
-            try:
-                order_dict[symbol].append(order)  # Append order to dicionary corresponding with symbol
-            except KeyError:
-                pass  # Discard orders that don't corespond to one of our tickers
 
-        # Create list of lists from dictionary
-        wanted_orders = list(order_dict.values())
-    
+    for order in all_orders:
+        currency_pair_id = order['currency_pair_id']
+        if currency_pair_id not in pair_symbols:  # Pair missing from the table, look it up individually
+            pair_symbols[currency_pair_id] = get_crypto_order_symbol(currency_pair_id)
+        symbol = pair_symbols[currency_pair_id]
+        order['symbol'] = symbol
+        if symbols is None:
+            order_dict.setdefault(symbol, []).append(order)
+        elif symbol in order_dict:
+            order_dict[symbol].append(order)  # Append order to dicionary corresponding with symbol
+        # Discard orders that don't corespond to one of our tickers
+
+    if symbols is None:
+        order_dict = dict((symbol, order_dict[symbol]) for symbol in sorted(order_dict))
+
+    # Create list of lists from dictionary
+    wanted_orders = rh_orders.parse_order_sets(order_dict.values())
+
     return wanted_orders
 
 
+def get_crypto_pair_symbols():
+
+    # Returns a dictionary mapping each currency pair ID to its symbol as used in order data (e.g. 'BTCUSD'). The pair
+    # table is fetched once rather than looking up a quote for every order.
+    currency_pairs = robin_stocks.crypto.get_crypto_currency_pairs()
+
+    pair_symbols = dict((pair['id'], pair['symbol'].replace('-', '')) for pair in currency_pairs)  # Ex: 'BTC-USD' -> 'BTCUSD'
+
+    return pair_symbols
+
+
 def get_crypto_order_symbol(currency_pair_id):
 
     return robin_stocks.crypto.get_crypto_quote_from_id(currency_pair_id, 'symbol')
@@ -0,0 +1,69 @@
+import functools
+from lazy_import import lazy_import
+asyncio = lazy_import('asyncio')
+
+# Local modules and files:
+import robinhood_fetch as rh_fetch
+
+
+# Coroutine versions of the robinhood_fetch functions, so that independent fetches can be awaited together with
+# asyncio.gather(). robin_stocks makes its requests with the blocking requests library, so each call is run on the
+# event loop's thread pool; the requests still go out concurrently, sharing robin_stocks' pooled HTTP session.
+
+
+async def run_blocking(func, *args):
+
+    loop = asyncio.get_running_loop()
+
+    return await loop.run_in_executor(None, functools.partial(func, *args))
+
+
+async def get_stock_positions_dicts():
+
+    return await run_blocking(rh_fetch.get_stock_positions_dicts)
+
+
+async def get_crypto_positions_dicts():
+
+    return await run_blocking(rh_fetch.get_crypto_positions_dicts)
+
+
+async def get_stock_dividends_dicts():
+
+    return await run_blocking(rh_fetch.get_stock_dividends_dicts)
+
+
+async def get_stock_orders(symbols):
+
+    return await run_blocking(rh_fetch.get_stock_orders, symbols)
+
+
+async def get_stock_quotes(symbols):
+
+    return await run_blocking(rh_fetch.get_stock_quotes, symbols)
+
+
+async def get_crypto_quotes(symbols):
+
+    return await run_blocking(rh_fetch.get_crypto_quotes, symbols)
+
+
+async def skip():
+
+    return None
+
+
+async def get_positions_dicts(get_stocks=True, get_crypto=True):
+
+    # Fetch stock and crypto positions at the same time. Returns None in place of positions that weren't requested.
+    stock_positions, crypto_positions = await asyncio.gather(get_stock_positions_dicts() if get_stocks else skip(),
+                                                             get_crypto_positions_dicts() if get_crypto else skip())
+
+    return stock_positions, crypto_positions
+
+
+async def get_quotes(stock_symbols, crypto_symbols):
+
+    stock_quotes, crypto_quotes = await asyncio.gather(get_stock_quotes(stock_symbols), get_crypto_quotes(crypto_symbols))
+
+    return stock_quotes, crypto_quotes
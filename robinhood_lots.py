@@ -0,0 +1,272 @@
+LOT_METHODS = ['fifo', 'lifo', 'hifo', 'specific', 'average']
+LONG_TERM_DAYS = 365  # Held more than a year
+WASH_SALE_DAYS = 30  # Replacement shares bought this many days before or after a sale at a loss
+QUANTITY_TOLERANCE = 1e-9  # Lots with less than this left are used up, to ignore float rounding
+REALIZED_GAIN_COLUMNS = ['ticker', 'acquired', 'sold', 'quantity', 'proceeds', 'cost_basis', 'gain', 'term', 'wash_sale']
+UNREALIZED_GAIN_COLUMNS = ['ticker', 'acquired', 'quantity', 'cost_basis', 'cost_per_share', 'term']
+
+
+import heapq
+from lazy_import import lazy_import
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+
+# Local modules and files:
+import robinhood_output as rh_output
+
+
+# Cost basis lots and realized and unrealized gains, from the dataframe made by
+# robinhood_process.process_stock_order_data(). Each buy execution opens a lot, and each sell execution closes
+# quantity from open lots of the same ticker, chosen by the lot method:
+#   fifo:     oldest lots first
+#   lifo:     newest lots first
+#   hifo:     highest cost per share first
+#   specific: the lots given for the sale in lot_selections, then oldest first
+#   average:  oldest lots first, but at the average cost per share of all open lots, as is common for crypto
+# The columns are cast and pulled out into lists once, and each ticker's executions are walked in time order with its
+# open lots in plain lists, so nothing is done per row in pandas. Times are handled as integer nanoseconds since the
+# epoch, UTC.
+
+
+def get_lot_tables(stock_orders_df, method='fifo', lot_selections=None):
+
+    # Returns (realized_df, unrealized_df). Buy fees are added to the cost basis and sell fees are taken off the
+    # proceeds. Sells of more than the open lots hold (e.g. shares transferred in, or orders outside of the tickers
+    # fetched) get a row with no acquired time or cost basis. Stock splits aren't in the order data, so they aren't
+    # accounted for. lot_selections is only used by the 'specific' method, see get_lot_selections().
+    if method not in LOT_METHODS:
+        raise ValueError(f"Unknown lot method '{method}', must be one of {', '.join(LOT_METHODS)}.")
+
+    df = rh_output.apply_dtypes(stock_orders_df, rh_output.STOCK_ORDER_DTYPES)
+    df = df.assign(ticker=df['ticker'].astype(str), time=get_time_ns(df['datetime']))
+    df = df.sort_values(['ticker', 'time'], kind='mergesort')  # Stable, so executions at the same time stay in order
+
+    notional = df['amount'] + df['fees/commission']  # The amount column has the fees taken off already
+    is_buy   = (df['side'] == 'buy').to_numpy()
+    values   = np.where(is_buy, notional + df['fees/commission'], notional - df['fees/commission'])
+
+    tickers    = df['ticker'].tolist()
+    times      = df['time'].tolist()
+    quantities = df['quantity'].tolist()
+    values     = values.tolist()
+    is_buy     = is_buy.tolist()
+
+    realized   = {'ticker': [], 'acquired': [], 'sold': [], 'quantity': [], 'proceeds': [], 'cost_basis': [], 'sale': []}
+    unrealized = {'ticker': [], 'acquired': [], 'quantity': [], 'cost_basis': []}
+
+    ticker_start = 0
+    while ticker_start < len(tickers):
+        ticker = tickers[ticker_start]
+        ticker_end = ticker_start
+        while ticker_end < len(tickers) and tickers[ticker_end] == ticker:
+            ticker_end += 1
+
+        selections = (lot_selections or {}).get(ticker, {})
+        match_ticker_lots(ticker, times[ticker_start:ticker_end], quantities[ticker_start:ticker_end],
+                          values[ticker_start:ticker_end], is_buy[ticker_start:ticker_end], method, selections,
+                          realized, unrealized, sale_offset=ticker_start)
+        ticker_start = ticker_end
+
+    buy_df = df.loc[df['side'] == 'buy', ['ticker', 'time']]
+    realized_df   = make_realized_df(realized, buy_df)
+    unrealized_df = make_unrealized_df(unrealized)
+
+    return realized_df, unrealized_df
+
+
+def get_time_ns(datetimes):
+
+    # Integer nanoseconds since the epoch, UTC, for a tz-aware datetime column
+    return datetimes.dt.tz_convert(None).to_numpy().astype('datetime64[ns]').view('int64')
+
+
+def match_ticker_lots(ticker, times, quantities, values, is_buy, method, selections, realized, unrealized, sale_offset=0):
+
+    # Open lots are kept in parallel lists, in the order they were bought. fifo and average take from the front, lifo
+    # from the back, and hifo from a heap of (-cost per share, lot index). Quantities and cost bases are reduced in
+    # place as lots are sold from.
+    lots = {'times': [], 'quantities': [], 'costs': [], 'first': 0, 'heap': [], 'indexes': {}}
+    open_quantity = 0.0
+    open_cost     = 0.0  # For average
+
+    for execution_idx, (time, quantity, value, buy) in enumerate(zip(times, quantities, values, is_buy)):
+
+        if buy:
+            if method == 'hifo':
+                heapq.heappush(lots['heap'], (-value/quantity if quantity else 0.0, len(lots['times'])))
+            elif method == 'specific':
+                lots['indexes'].setdefault(time, []).append(len(lots['times']))
+            lots['times'].append(time)
+            lots['quantities'].append(quantity)
+            lots['costs'].append(value)
+            open_quantity += quantity
+            open_cost     += value
+            continue
+
+        # Sell: close quantity from open lots, one realized row per lot
+        sale = sale_offset + execution_idx
+        remaining = quantity
+        selected_lots = [lot_idx for lot_time in selections.get(time, []) for lot_idx in lots['indexes'].get(lot_time, [])]
+        while remaining > QUANTITY_TOLERANCE:
+            lot_idx = get_next_lot(lots, method, selected_lots)
+            if lot_idx is None:
+                break
+
+            lot_quantity  = lots['quantities'][lot_idx]
+            sold_quantity = min(remaining, lot_quantity)
+            lot_cost_sold = lots['costs'][lot_idx] * sold_quantity / lot_quantity
+            if method == 'average':
+                cost_basis = open_cost * sold_quantity / open_quantity
+            else:
+                cost_basis = lot_cost_sold
+
+            realized['ticker'].append(ticker)
+            realized['acquired'].append(lots['times'][lot_idx])
+            realized['sold'].append(time)
+            realized['quantity'].append(sold_quantity)
+            realized['proceeds'].append(value * sold_quantity / quantity)
+            realized['cost_basis'].append(cost_basis)
+            realized['sale'].append(sale)
+
+            lots['quantities'][lot_idx] -= sold_quantity
+            lots['costs'][lot_idx]      -= lot_cost_sold
+            open_quantity               -= sold_quantity
+            open_cost                   -= cost_basis
+            remaining                   -= sold_quantity
+
+        if remaining > QUANTITY_TOLERANCE:  # Sold more than was bought
+            realized['ticker'].append(ticker)
+            realized['acquired'].append(None)
+            realized['sold'].append(time)
+            realized['quantity'].append(remaining)
+            realized['proceeds'].append(value * remaining / quantity)
+            realized['cost_basis'].append(None)
+            realized['sale'].append(sale)
+
+        if open_quantity <= QUANTITY_TOLERANCE:  # Everything sold, start over so the lists don't keep growing
+            lots = {'times': [], 'quantities': [], 'costs': [], 'first': 0, 'heap': [], 'indexes': {}}
+            open_quantity = 0.0
+            open_cost     = 0.0
+
+    average_cost = open_cost / open_quantity if open_quantity > QUANTITY_TOLERANCE else 0.0
+    for lot_time, lot_quantity, lot_cost in zip(lots['times'], lots['quantities'], lots['costs']):
+        if lot_quantity <= QUANTITY_TOLERANCE:
+            continue
+        unrealized['ticker'].append(ticker)
+        unrealized['acquired'].append(lot_time)
+        unrealized['quantity'].append(lot_quantity)
+        unrealized['cost_basis'].append(average_cost * lot_quantity if method == 'average' else lot_cost)
+
+
+def get_next_lot(lots, method, selected_lots):
+
+    # Index of the open lot to sell from next, or None if there are none left. Used up lots are dropped from the back
+    # (lifo), the heap (hifo), or skipped past at the front (everything else) so each one is only looked at once.
+    quantities = lots['quantities']
+
+    if method == 'lifo':
+        while quantities and quantities[-1] <= QUANTITY_TOLERANCE:
+            lots['times'].pop()
+            lots['costs'].pop()
+            quantities.pop()
+        return len(quantities) - 1 if quantities else None
+
+    if method == 'hifo':
+        heap = lots['heap']
+        while heap and quantities[heap[0][1]] <= QUANTITY_TOLERANCE:
+            heapq.heappop(heap)
+        return heap[0][1] if heap else None
+
+    while selected_lots:  # specific
+        if quantities[selected_lots[0]] > QUANTITY_TOLERANCE:
+            return selected_lots[0]
+        selected_lots.pop(0)  # Already sold, or used up by this sale
+
+    while lots['first'] < len(quantities) and quantities[lots['first']] <= QUANTITY_TOLERANCE:
+        lots['first'] += 1
+    return lots['first'] if lots['first'] < len(quantities) else None
+
+
+def make_realized_df(realized, buy_df):
+
+    df = pd.DataFrame(realized)
+    df['acquired']   = pd.to_datetime(pd.array(df['acquired'], dtype='Int64'), utc=True)  # None becomes NaT
+    df['sold']       = pd.to_datetime(df['sold'].astype('int64'), utc=True)
+    df['cost_basis'] = df['cost_basis'].astype('float64')
+    df['gain']       = df['proceeds'] - df['cost_basis']
+    df['term']       = get_terms(df['acquired'], df['sold'])
+    df['wash_sale']  = get_wash_sales(df, buy_df)
+
+    df = df.sort_values(['sold', 'ticker', 'acquired'], kind='mergesort').reset_index(drop=True)
+
+    return df[REALIZED_GAIN_COLUMNS]
+
+
+def make_unrealized_df(unrealized, as_of=None):
+
+    df = pd.DataFrame(unrealized)
+    df['acquired'] = pd.to_datetime(df['acquired'].astype('int64'), utc=True)
+    df['cost_per_share'] = df['cost_basis'] / df['quantity']
+    df['term'] = get_terms(df['acquired'], as_of if as_of is not None else pd.Timestamp.now(tz='UTC'))
+
+    return df[UNREALIZED_GAIN_COLUMNS]
+
+
+def get_terms(acquired, disposed):
+
+    is_long_term = (disposed - acquired) > pd.Timedelta(days=LONG_TERM_DAYS)
+    terms = np.where(is_long_term, 'long', 'short')
+    terms = np.where(acquired.isna(), None, terms)  # Unknown without an acquired time
+
+    return pd.Series(terms, index=acquired.index, dtype='category')
+
+
+def get_wash_sales(realized_df, buy_df):
+
+    # A sale at a loss is flagged when shares of the same ticker were bought within WASH_SALE_DAYS before or after it,
+    # not counting the lots closed by the sale itself. This flags the sale; it doesn't work out how much of the loss is
+    # disallowed or adjust the basis of the replacement shares. Buys in the window are counted with searchsorted on
+    # each ticker's sorted buy times.
+    window = WASH_SALE_DAYS * 24 * 60 * 60 * 10**9
+    sold = realized_df['sold'].dt.tz_convert(None).to_numpy().astype('datetime64[ns]').view('int64')
+    acquired = realized_df['acquired'].dt.tz_convert(None).to_numpy().astype('datetime64[ns]').view('int64')
+    has_acquired = realized_df['acquired'].notna().to_numpy()
+
+    num_buys_in_window = np.zeros(len(realized_df), dtype='int64')
+    buy_times_by_ticker = dict((ticker, np.sort(group['time'].to_numpy())) for ticker, group in buy_df.groupby('ticker', sort=False))
+    for ticker, row_idxs in realized_df.groupby('ticker', sort=False).indices.items():
+        buy_times = buy_times_by_ticker.get(ticker)
+        if buy_times is None:
+            continue
+        num_buys_in_window[row_idxs] = (np.searchsorted(buy_times, sold[row_idxs] + window, side='right') -
+                                        np.searchsorted(buy_times, sold[row_idxs] - window, side='left'))
+
+    is_own_lot_in_window = has_acquired & (np.abs(sold - acquired) <= window)
+    num_own_lots_in_window = pd.Series(is_own_lot_in_window).groupby(realized_df['sale'].to_numpy()).transform('sum').to_numpy()
+
+    return (realized_df['gain'] < 0).to_numpy() & (num_buys_in_window > num_own_lots_in_window)
+
+
+def add_quotes_to_unrealized_df(unrealized_df, stock_quotes):
+
+    # stock_quotes maps each ticker to its price, as returned by robinhood_fetch.get_stock_quotes()
+    df = unrealized_df.copy()
+    df['quote']        = pd.to_numeric(df['ticker'].map(stock_quotes), errors='coerce')
+    df['market_value'] = df['quote'] * df['quantity']
+    df['gain']         = df['market_value'] - df['cost_basis']
+
+    return df
+
+
+def get_lot_selections(lot_selections_dict):
+
+    # Lots to sell for the 'specific' method, from JSON like
+    #   {"AAPL": {"2021-03-01 15:30:00 UTC": ["2020-01-02 14:31:00 UTC", "2020-06-01 13:30:00 UTC"]}}
+    # mapping each ticker's sell executions to the buy executions to take shares from, in order, with times as in the
+    # -so output. Shares not covered by the listed lots come from the oldest lots.
+    def to_ns(datetime_str):
+        return pd.to_datetime(datetime_str.replace(' UTC', ''), utc=True).value  # Times without an offset are UTC
+
+    return dict((ticker, dict((to_ns(sold), [to_ns(acquired) for acquired in acquired_list])
+                              for sold, acquired_list in sales.items()))
+                for ticker, sales in lot_selections_dict.items())
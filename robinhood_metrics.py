@@ -0,0 +1,112 @@
+ID_PATH_SEGMENT_PATTERN = r'/[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}(?=/|$)'  # Order, instrument, etc. IDs
+PROMETHEUS_METRIC_PREFIX = 'robinhood_fetch'
+
+
+import re
+import json
+import time
+import atexit
+import threading
+from urllib.parse import urlsplit
+from lazy_import import lazy_import
+robin_stocks = lazy_import('robin_stocks')
+
+
+# Optional instrumentation of the requests made to Robinhood. Every request, whether made by robin_stocks or by
+# robinhood_fetch, goes through robin_stocks' shared requests session, so a response hook on that session sees them
+# all. Requests are grouped by endpoint, with IDs in the URL path replaced by '{id}'. Nothing is installed until
+# enable() is called, so there is no cost when instrumentation is off.
+
+METRICS = None  # Set by enable()
+
+
+class FetchMetrics:
+  # Per-endpoint request counts, errors, retries, time, and response sizes. Updated from the fetch worker threads, so
+  # updates are done under a lock.
+
+  def __init__(self):
+    self.started_at = time.time()
+    self.endpoints  = {}
+    self.lock       = threading.Lock()
+
+  def get_endpoint_stats(self, url):
+    parts    = urlsplit(url)
+    endpoint = parts.netloc + re.sub(ID_PATH_SEGMENT_PATTERN, '/{id}', parts.path)
+    if endpoint not in self.endpoints:
+      self.endpoints[endpoint] = {'requests': 0, 'errors': 0, 'retries': 0, 'seconds': 0.0, 'max_seconds': 0.0,
+                                  'bytes': 0}
+    return self.endpoints[endpoint]
+
+  def record_response(self, response, *args, **kwargs):
+    # requests response hook. response.elapsed stops once the headers are in, so time reading the body here too.
+    start_time    = time.perf_counter()
+    num_bytes     = len(response.content)
+    total_seconds = response.elapsed.total_seconds() + (time.perf_counter() - start_time)
+    with self.lock:
+      stats = self.get_endpoint_stats(response.url)
+      stats['requests']   += 1
+      stats['errors']     += response.status_code >= 400
+      stats['seconds']    += total_seconds
+      stats['max_seconds'] = max(stats['max_seconds'], total_seconds)
+      stats['bytes']      += num_bytes
+
+  def record_retry(self, exception):
+    response = getattr(exception, 'response', None)
+    with self.lock:
+      stats = self.get_endpoint_stats(getattr(response, 'url', None) or 'unknown')
+      stats['retries'] += 1
+
+  def get_summary(self):
+    with self.lock:
+      endpoints = dict((endpoint, dict(stats)) for endpoint, stats in self.endpoints.items())
+    for stats in endpoints.values():
+      stats['mean_seconds'] = stats['seconds'] / stats['requests'] if stats['requests'] else 0.0
+    endpoints = dict(sorted(endpoints.items(), key=lambda item: item[1]['seconds'], reverse=True))  # Slowest first
+
+    return {'started_at':      time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started_at)),
+            'elapsed_seconds': time.time() - self.started_at,
+            'requests':        sum(stats['requests'] for stats in endpoints.values()),
+            'errors':          sum(stats['errors'] for stats in endpoints.values()),
+            'retries':         sum(stats['retries'] for stats in endpoints.values()),
+            'seconds':         sum(stats['seconds'] for stats in endpoints.values()),
+            'bytes':           sum(stats['bytes'] for stats in endpoints.values()),
+            'endpoints':       endpoints}
+
+  def get_prometheus_text(self):
+    # See https://prometheus.io/docs/instrumenting/exposition_formats/
+    summary = self.get_summary()
+    metrics = [('requests_total',       'requests',    'counter', 'Requests made to Robinhood.'),
+               ('errors_total',         'errors',      'counter', 'Requests that got an HTTP error status.'),
+               ('retries_total',        'retries',     'counter', 'Requests retried after rate limiting or a server error.'),
+               ('seconds_total',        'seconds',     'counter', 'Time spent on requests, including reading the response.'),
+               ('max_seconds',          'max_seconds', 'gauge',   'Time taken by the slowest request.'),
+               ('response_bytes_total', 'bytes',       'counter', 'Size of the response bodies.')]
+    lines = []
+    for metric_name, field, metric_type, help_text in metrics:
+      metric_name = f"{PROMETHEUS_METRIC_PREFIX}_{metric_name}"
+      lines.append(f"# HELP {metric_name} {help_text}")
+      lines.append(f"# TYPE {metric_name} {metric_type}")
+      for endpoint, stats in summary['endpoints'].items():
+        lines.append(f'{metric_name}{{endpoint="{endpoint}"}} {stats[field]}')
+    return '\n'.join(lines) + '\n'
+
+
+def enable(json_file_path=None, prometheus_file_path=None):
+
+    # Start collecting metrics, and write them to whichever of the given files at exit
+    global METRICS
+    METRICS = FetchMetrics()
+    robin_stocks.helper.SESSION.hooks['response'].append(METRICS.record_response)
+    atexit.register(write_metrics_files, json_file_path, prometheus_file_path)
+
+    return METRICS
+
+
+def write_metrics_files(json_file_path=None, prometheus_file_path=None):
+
+    if json_file_path:
+        with open(json_file_path, "w") as json_file:
+            json.dump(METRICS.get_summary(), json_file, indent=2)
+    if prometheus_file_path:
+        with open(prometheus_file_path, "w") as prometheus_file:
+            prometheus_file.write(METRICS.get_prometheus_text())
@@ -0,0 +1,58 @@
+import json
+import sqlite3
+
+
+class OrderStore:
+  # Local SQLite copy of the Robinhood order history. Orders are keyed by their ID, so saving an order that is already
+  # stored replaces it with the newer version. The latest 'updated_at' value saved is kept as a cursor so that later
+  # syncs only need to ask Robinhood for orders updated since then.
+
+  def __init__(self, file_path):
+    self.file_path  = file_path
+    self.connection = sqlite3.connect(file_path)
+    self.connection.execute("CREATE TABLE IF NOT EXISTS orders (id TEXT PRIMARY KEY, kind TEXT, instrument TEXT, "
+                            "state TEXT, created_at TEXT, updated_at TEXT, data TEXT)")
+    self.connection.execute("CREATE INDEX IF NOT EXISTS orders_kind_instrument ON orders (kind, instrument)")
+    self.connection.execute("CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT)")
+    self.connection.commit()
+
+  def close(self):
+    self.connection.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+
+  def save_orders(self, orders, kind='stock', update_cursor=True):
+    # Pass update_cursor=False when saving part of a sync, so that an interrupted sync doesn't move the cursor past
+    # orders that haven't been saved yet, then call update_cursor() once the sync is done.
+    rows = [(order['id'], kind, order.get('instrument'), order['state'], order['created_at'], order['updated_at'],
+             json.dumps(order)) for order in orders]
+    with self.connection:  # Commits, or rolls back if there is an error
+      self.connection.executemany("INSERT OR REPLACE INTO orders VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    if rows and update_cursor:
+      self.update_cursor(max(row[5] for row in rows), kind)
+
+  def update_cursor(self, updated_at, kind='stock'):
+    if updated_at > (self.get_cursor(kind) or ''):  # ISO 8601 UTC timestamps sort as strings
+      with self.connection:
+        self.connection.execute("INSERT OR REPLACE INTO sync_state VALUES (?, ?)", (kind + '_updated_at', updated_at))
+
+  def get_cursor(self, kind='stock'):
+    row = self.connection.execute("SELECT value FROM sync_state WHERE key = ?", (kind + '_updated_at',)).fetchone()
+    return row[0] if row else None
+
+  def get_orders(self, kind='stock', instruments=None):
+    # Newest first, matching the order Robinhood returns them in
+    query = "SELECT data FROM orders WHERE kind = ?"
+    params = [kind]
+    if instruments is not None:
+      query += f" AND instrument IN ({', '.join('?' * len(instruments))})"
+      params += instruments
+    query += " ORDER BY created_at DESC"
+    return [json.loads(row[0]) for row in self.connection.execute(query, params)]
+
+  def get_instruments(self, kind='stock'):
+    return [row[0] for row in self.connection.execute("SELECT DISTINCT instrument FROM orders WHERE kind = ?", (kind,))]
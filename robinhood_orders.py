@@ -0,0 +1,61 @@
+# Compact records for orders and their executions. Robinhood returns every number as a string, and the raw order dicts
+# carry dozens of fields that aren't used here, so orders are parsed into these once, right after they are fetched, and
+# everything downstream works with floats. __slots__ keeps each record small when there are many thousands of them.
+
+
+def to_float(value):
+
+    # Robinhood uses None (and occasionally '') for values that don't apply to an order
+    if value is None or value == '':
+        return None
+
+    return float(value)
+
+
+class Execution:
+  __slots__ = ('quantity', 'price', 'rounded_notional', 'timestamp')
+
+  def __init__(self, execution_dict):
+    self.quantity         = to_float(execution_dict['quantity'])
+    self.price            = to_float(execution_dict.get('price'))  # Only stock executions have a price
+    self.rounded_notional = to_float(execution_dict.get('rounded_notional'))
+    self.timestamp        = execution_dict['timestamp']
+
+
+class Order:
+  __slots__ = ('id', 'symbol', 'state', 'side', 'type', 'quantity', 'price', 'fees', 'executed_notional',
+               'rounded_executed_notional', 'created_at', 'updated_at', 'executions')
+
+  def __init__(self, order_dict):
+    self.id                        = order_dict.get('id')
+    self.symbol                    = order_dict.get('symbol')
+    self.state                     = order_dict['state']
+    self.side                      = order_dict['side']
+    self.type                      = order_dict['type']
+    self.quantity                  = to_float(order_dict.get('quantity'))
+    self.price                     = to_float(order_dict.get('price'))
+    self.fees                      = to_float(order_dict.get('fees')) or 0.0
+    self.rounded_executed_notional = to_float(order_dict.get('rounded_executed_notional'))  # Crypto orders only
+    self.created_at                = order_dict.get('created_at')
+    self.updated_at                = order_dict.get('updated_at')
+    self.executions                = [Execution(execution_dict) for execution_dict in order_dict['executions']]
+
+    executed_notional = order_dict.get('executed_notional')  # Stock orders only
+    self.executed_notional = to_float(executed_notional['amount']) if executed_notional else None
+
+
+def parse_order_sets(order_sets):
+
+    # Convert a list of lists of order dicts, as returned by the robinhood_fetch order functions, to Order records
+    parsed_order_sets = []
+    for order_set in order_sets:
+        parsed_order_set = []
+        for order_dict in order_set:
+            try:
+                parsed_order_set.append(Order(order_dict))
+            except:
+                print(order_dict)
+                raise
+        parsed_order_sets.append(parsed_order_set)
+
+    return parsed_order_sets
@@ -0,0 +1,157 @@
+OUTPUT_FORMATS = ['csv', 'csv.gz', 'parquet', 'feather']
+COLUMNAR_OUTPUT_FORMATS = ['parquet', 'feather']  # Need pyarrow
+OUTPUT_FORMAT_EXTENSIONS = {'.csv.gz': 'csv.gz', '.gz': 'csv.gz', '.parquet': 'parquet', '.feather': 'feather',
+                            '.arrow': 'feather', '.csv': 'csv'}
+
+# Column types for each dataset. Parquet and Feather files store these, so reading them back needs no parsing. CSV files
+# are written as before, and read_output_file() uses these to get the same types back from them.
+STOCK_ORDER_DTYPES = {'ticker':           'category',
+                      'datetime':         'datetime64[ns, UTC]',
+                      'side':             'category',
+                      'type':             'category',
+                      'exeuction number': 'int32',
+                      'num_executions':   'int32',
+                      'quantity':         'float64',
+                      'price':            'float64',
+                      'amount':           'float64',
+                      'fees/commission':  'float64'}
+STOCK_POSITION_DTYPES = {'ticker':     'string',
+                         'name':       'string',
+                         'sec_type':   'category',
+                         'quantity':   'float64',
+                         'equity':     'float64',
+                         'quote':      'float64',
+                         'percentage': 'float64'}
+STOCK_DIVIDEND_DTYPES = {'paid_at':         'datetime64[ns, UTC]',
+                         'record_date':     'datetime64[ns]',
+                         'symbol':          'category',
+                         'amount':          'float64',
+                         'position':        'float64',
+                         'rate':            'float64',
+                         'withholding':     'float64',
+                         'drip_enabled':    'boolean',
+                         'nra_withholding': 'float64'}
+DIVIDEND_BY_SYMBOL_DTYPES = {'symbol':         'string',
+                             'num_dividends':  'int32',
+                             'amount':         'float64',
+                             'withholding':    'float64',
+                             'net_amount':     'float64',
+                             'ttm_amount':     'float64',
+                             'ttm_net_amount': 'float64',
+                             'first_paid':     'datetime64[ns, UTC]',
+                             'last_paid':      'datetime64[ns, UTC]',
+                             'cost_basis':     'float64',
+                             'yield_on_cost':  'float64'}
+DIVIDEND_BY_MONTH_DTYPES = {'month':          'datetime64[ns]',
+                            'num_dividends':  'int32',
+                            'amount':         'float64',
+                            'withholding':    'float64',
+                            'net_amount':     'float64',
+                            'ttm_amount':     'float64',
+                            'ttm_net_amount': 'float64'}
+REALIZED_GAIN_DTYPES = {'ticker':     'string',
+                        'acquired':   'datetime64[ns, UTC]',
+                        'sold':       'datetime64[ns, UTC]',
+                        'quantity':   'float64',
+                        'proceeds':   'float64',
+                        'cost_basis': 'float64',
+                        'gain':       'float64',
+                        'term':       'category',
+                        'wash_sale':  'boolean'}
+UNREALIZED_GAIN_DTYPES = {'ticker':         'string',
+                          'acquired':       'datetime64[ns, UTC]',
+                          'quantity':       'float64',
+                          'cost_basis':     'float64',
+                          'cost_per_share': 'float64',
+                          'term':           'category',
+                          'quote':          'float64',
+                          'market_value':   'float64',
+                          'gain':           'float64'}
+DATETIME_FORMATS = {'datetime': '%Y-%m-%d %H:%M:%S UTC'}  # Order times as written by robinhood_process, much faster to parse with the format given
+
+
+import importlib.util
+from lazy_import import lazy_import
+pd = lazy_import('pandas')
+
+
+def get_output_format(output_file_path, output_format=None):
+
+    # An explicitly given format wins, otherwise it comes from the file extension, defaulting to CSV
+    if output_format is not None:
+        return output_format
+
+    for extension, extension_format in OUTPUT_FORMAT_EXTENSIONS.items():  # '.csv.gz' is checked before '.gz'
+        if output_file_path.lower().endswith(extension):
+            return extension_format
+
+    return 'csv'
+
+
+def add_file_name_suffix(output_file_path, suffix):
+
+    # Ex: ('dividends.csv.gz', '_by_month') -> 'dividends_by_month.csv.gz'
+    for extension in OUTPUT_FORMAT_EXTENSIONS:
+        if output_file_path.lower().endswith(extension):
+            return output_file_path[:-len(extension)] + suffix + output_file_path[-len(extension):]
+
+    return output_file_path + suffix
+
+
+def check_output_format_available(output_format):
+
+    if output_format in COLUMNAR_OUTPUT_FORMATS and importlib.util.find_spec('pyarrow') is None:
+        raise ImportError(f"Writing {output_format} files requires the pyarrow package (pip install pyarrow).")
+
+
+def apply_dtypes(df, dtypes):
+
+    # Cast each column that has an entry in dtypes. Number columns can hold placeholders like '?', which become NaN.
+    df = df.copy()
+    for column, dtype in dtypes.items():
+        if column not in df.columns:
+            continue
+        if dtype.startswith('datetime64'):
+            df[column] = pd.to_datetime(df[column], utc=('UTC' in dtype), format=DATETIME_FORMATS.get(column))
+        elif dtype.startswith('float') or dtype.startswith('int'):
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype(dtype)
+        else:
+            df[column] = df[column].astype(dtype)
+
+    return df
+
+
+def write_df(df, output_file_path, dtypes, index=False, output_format=None):
+
+    output_format = get_output_format(output_file_path, output_format)
+
+    if output_format == 'csv':
+        df.to_csv(output_file_path, index=index, compression=None)
+    elif output_format == 'csv.gz':
+        df.to_csv(output_file_path, index=index, compression='gzip')
+    else:
+        check_output_format_available(output_format)
+        if index:
+            df = df.reset_index()  # Feather can't store an index, so keep the columnar formats the same
+        df = apply_dtypes(df, dtypes)
+        if output_format == 'parquet':
+            df.to_parquet(output_file_path, index=False)
+        else:
+            df.reset_index(drop=True).to_feather(output_file_path)
+
+    return output_format
+
+
+def read_output_file(input_file_path, dtypes, input_format=None):
+
+    # Read a file written by write_df() back into a dataframe with the column types in dtypes
+    input_format = get_output_format(input_file_path, input_format)
+
+    if input_format == 'parquet':
+        return pd.read_parquet(input_file_path)
+    elif input_format == 'feather':
+        return pd.read_feather(input_file_path)
+
+    df = pd.read_csv(input_file_path, compression=('gzip' if input_format == 'csv.gz' else None))
+
+    return apply_dtypes(df, dtypes)
@@ -1,100 +1,148 @@
 RH_DATA_JSON_FILE_PATH_STOCKS = "robinhood_stock_positions.json"
 RH_DATA_JSON_FILE_PATH_CRYPTO = "robinhood_crypto_positions.json"
+STOCK_ORDER_COLUMNS = ['ticker', 'datetime', 'side', 'type', 'exeuction number', 'num_executions', 'quantity', 'price', 'amount', 'fees/commission']
+POSITION_DIFF_COLUMNS = ['ticker', 'type', 'change', 'previous_quantity', 'quantity', 'previous_equity', 'equity']
+QIF_CHUNK_SIZE = 1000  # Number of QIF records to format before each write
+DATETIME_STR_CACHE_SIZE = 4096
+ORDER_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'  # Most Robinhood timestamps; others are parsed one at a time
 
 
 import sys
-import robin_stocks
+import gzip
+import contextlib
 import json
-import pandas as pd
+from datetime import timezone
 import functools
 print = functools.partial(print, flush=True)  # Prevent print statements from buffering till end of execution
 import argparse
-import dateutil.parser
+from lazy_import import lazy_import
+pd = lazy_import('pandas')  # Loaded when first used, so that --help and argument errors don't wait for it
+dateutil_parser = lazy_import('dateutil.parser')
+asyncio = lazy_import('asyncio')
 
 # Local modules and files:
 import robinhood_fetch as rh_fetch
+import robinhood_fetch_async as rh_fetch_async
+import robinhood_snapshot as rh_snapshot
+import robinhood_output as rh_output
+import robinhood_dividends as rh_dividends
+import robinhood_lots as rh_lots
+import robinhood_metrics as rh_metrics
+rh_replay = lazy_import('robinhood_replay')  # Only needed for --record and --replay
 
+STDOUT = sys.stdout  # Saved since sys.stdout is pointed at stderr when QIF output goes to stdout
 
+
+@functools.lru_cache(maxsize=DATETIME_STR_CACHE_SIZE)
 def format_datetime_str(order_dt_str):
-    
-    order_dt     = dateutil.parser.isoparse(order_dt_str)
-    order_dt_str = order_dt.strftime('%Y-%m-%d %H:%M:%S %Z')
+
+    # Converted to UTC, as format_datetime_strs() does, so that streamed and sorted output match. Timestamps without an
+    # offset are taken to be in UTC.
+    order_dt = dateutil_parser.isoparse(order_dt_str)
+    if order_dt.tzinfo is None:
+        order_dt = order_dt.replace(tzinfo=timezone.utc)
+    order_dt_str = order_dt.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S %Z')
 
     return order_dt_str
 
 
-def process_stock_order_data(stock_orders_dicts):
+def format_datetime_strs(order_dt_strs):
+
+    # Vectorized format_datetime_str() for a whole column of ISO 8601 timestamps. Robinhood timestamps are in UTC, so
+    # the output matches format_datetime_str()'s. Timestamps with other UTC offsets are converted to UTC.
+    # Without a format, pandas guesses one from the first timestamp and fails on any that don't match it, such as one
+    # without fractional seconds in a column of ones with them.
+    order_dts = pd.to_datetime(order_dt_strs, utc=True, format=ORDER_DATETIME_FORMAT, errors='coerce')
+    unparsed  = order_dts.isna() & order_dt_strs.notna()
+    if unparsed.any():
+        order_dts.loc[unparsed] = pd.to_datetime(order_dt_strs[unparsed].map(dateutil_parser.isoparse), utc=True)
+    order_dt_strs = order_dts.dt.strftime('%Y-%m-%d %H:%M:%S UTC')
+
+    return order_dt_strs
 
-    order_df = pd.DataFrame(columns=['ticker', 'datetime', 'side', 'type', 'exeuction number', 'num_executions', 'quantity', 'price', 'amount', 'fees/commission'])
 
-    for order_set in stock_orders_dicts:
+def process_stock_order_data(stock_orders):
+
+    # Build the dataframe in a single construction. Appending with order_df.loc[len(order_df)] copies the frame on every
+    # row.
+    order_records = list(iterate_stock_order_records(stock_orders, format_datetimes=False))
+    order_df = pd.DataFrame.from_records(order_records, columns=STOCK_ORDER_COLUMNS)
+    order_df['datetime'] = format_datetime_strs(order_df['datetime'])
+
+    return order_df
+
+
+def iterate_stock_order_records(stock_orders, format_datetimes=True):
+
+    # Walk the lists of robinhood_orders.Order records once, yielding a tuple with the STOCK_ORDER_COLUMNS values for
+    # each execution of each filled order. If format_datetimes is False, the raw timestamp is left for the caller to
+    # format all at once with format_datetime_strs().
+    for order_set in stock_orders:
         for order in order_set:
-            
-            ticker = order['symbol']
-            num_executions = len(order['executions'])
-            order_type = order['type']
-            side = order['side']
-            
-            for execution_idx, execution in enumerate(order['executions']):
+
+            if order.state != 'filled':  # Exclude canceled and failed orders
+                continue
+
+            ticker = order.symbol
+            num_executions = len(order.executions)
+            order_type = order.type
+            side = order.side
+
+            for execution_idx, execution in enumerate(order.executions):
                 try:
-                    if order['state'] == 'filled':  # Exclude canceled and failed orders
-                        
-                        quantity = float(execution['quantity'])
-
-                        if 'price' in execution:  # Stock order data puts price data in each execution
-                            price =  float(execution['price'])
-                        else:  # Crypto order data puts price with order data
-                            price = float(order['price'])
-
-                        if num_executions > 1 and execution['rounded_notional'] is not None:  # Stock orders with more than one execution uses 'rounded_notional', separate for each execution
-                            amount = float(execution['rounded_notional'])
-                        elif num_executions > 1 and execution['rounded_notional'] is None:  # Stock stock orders with more than one execution have None as the rounded_notional
-                            amount = float(execution['price']) * float(execution['quantity'])
-                        elif num_executions == 1 and 'executed_notional' in order:  # Stock orders with only one execution use 'executed_notional'['amount']
-                            amount = float(order['executed_notional']['amount'])
-                        else:  # Crypto order data uses 'rounded_executed_notional'
-                            amount = float(order['rounded_executed_notional'])
-
-                        datetime_str = format_datetime_str(execution['timestamp'])
-
-                        if execution_idx == 0:  # Only apply fees/commission to the first execution
-                            fees = float(order['fees'])
-                        else:
-                            fees = 0
-
-                        amount = amount - fees  # Take fees off the amount so that commission/fees will be recognized by Banktivity
-                    
-                        # Treat all executions together as a single transaction
-                        # quantity = float(order['cumulative_quantity'])
-
-                        # if 'average_price' in order:
-                        #     price =  float(order['average_price'])
-                        # else:
-                        #     price = float(order['price'])
-
-                        # if 'executed_notional' in order:  # Stock orders use 'executed_notional'['amount']
-                        #     amount = float(order['executed_notional']['amount'])
-                        # else:  # Crypto order data uses 'rounded_executed_notional'
-                        #     amount = float(order['rounded_executed_notional'])
-                        
-                        # datetime_str = format_datetime_str(order['updated_at'])
-
-                        # fees = float(order['fees'])
-
-
-                        # Append items to dataframe
-                        order_df.loc[len(order_df)] = [ticker, datetime_str, side, order_type, execution_idx+1, num_executions, quantity, price, amount, fees]
+                    quantity = execution.quantity
+
+                    if execution.price is not None:  # Stock order data puts price data in each execution
+                        price = execution.price
+                    else:  # Crypto order data puts price with order data
+                        price = order.price
+
+                    if num_executions > 1 and execution.rounded_notional is not None:  # Stock orders with more than one execution uses 'rounded_notional', separate for each execution
+                        amount = execution.rounded_notional
+                    elif num_executions > 1 and execution.rounded_notional is None:  # Stock stock orders with more than one execution have None as the rounded_notional
+                        amount = price * quantity
+                    elif num_executions == 1 and order.executed_notional is not None:  # Stock orders with only one execution use 'executed_notional'['amount']
+                        amount = order.executed_notional
+                    else:  # Crypto order data uses 'rounded_executed_notional'
+                        amount = order.rounded_executed_notional
+
+                    if format_datetimes:
+                        datetime_str = format_datetime_str(execution.timestamp)
+                    else:
+                        datetime_str = execution.timestamp
+
+                    if execution_idx == 0:  # Only apply fees/commission to the first execution
+                        fees = order.fees
+                    else:
+                        fees = 0.0
+
+                    amount = amount - fees  # Take fees off the amount so that commission/fees will be recognized by Banktivity
+
+                    # Treat all executions together as a single transaction
+                    # quantity = float(order['cumulative_quantity'])
+
+                    # if 'average_price' in order:
+                    #     price =  float(order['average_price'])
+                    # else:
+                    #     price = float(order['price'])
+
+                    # if 'executed_notional' in order:  # Stock orders use 'executed_notional'['amount']
+                    #     amount = float(order['executed_notional']['amount'])
+                    # else:  # Crypto order data uses 'rounded_executed_notional'
+                    #     amount = float(order['rounded_executed_notional'])
+
+                    # datetime_str = format_datetime_str(order['updated_at'])
+
+                    # fees = float(order['fees'])
 
                 except:
-                    print(order)
+                    print(order.id, ticker)
                     raise
-                    sys.exit()
-
 
-    return order_df
+                yield (ticker, datetime_str, side, order_type, execution_idx+1, num_executions, quantity, price, amount, fees)
 
 
-def process_stock_positions_data(stock_positions_dicts, get_quotes=False):
+def process_stock_positions_data(stock_positions_dicts, get_quotes=False, stock_quotes=None):
   
     df = pd.DataFrame(stock_positions_dicts, index=None)
     df = df.transpose()
@@ -104,9 +152,11 @@ def process_stock_positions_data(stock_positions_dicts, get_quotes=False):
     df['type']      = 'stock'
     
     if get_quotes:
-        print("\nGetting stock quotes from Robinhood. This may take a few minutes... ", end="")
-        df['quote'] = df.apply(lambda row: get_stock_quote(row), axis=1)
-        print("Done.")
+        if stock_quotes is None:  # Not already fetched by the caller
+            print("\nGetting stock quotes from Robinhood... ", end="")
+            stock_quotes = rh_fetch.get_stock_quotes(df.index.tolist())
+            print("Done.")
+        df['quote'] = df.index.map(stock_quotes)
     else:
         df['quote'] = '?'
 
@@ -117,14 +167,7 @@ def process_stock_positions_data(stock_positions_dicts, get_quotes=False):
     return df
 
 
-def get_stock_quote(row):
-
-    quote = robin_stocks.stocks.get_stock_quote_by_symbol(row.name)['last_trade_price']
-    
-    return quote
-
-
-def process_crypto_positions_data(crypto_positions_dicts, get_quotes=False):
+def process_crypto_positions_data(crypto_positions_dicts, get_quotes=False, crypto_quotes=None):
 
     df = pd.DataFrame(crypto_positions_dicts, index=None)
 
@@ -138,17 +181,19 @@ def process_crypto_positions_data(crypto_positions_dicts, get_quotes=False):
     df.drop(df.columns.difference(['quantity']), 1, inplace=True)
     df['name']     = names
     df['type']     = 'crypto'
-    df['ticker']   = symbols  # Changed later, but this is used in get_crypto_quote() below
+    df['ticker']   = symbols  # Changed later, but this is used to get quotes below
     df = df[df['ticker'] != 'USD']  # Drop 'USD'/'USDUSDT' ticker from list of crypto positions
+    df['quantity'] = df['quantity'].astype('float')
     if get_quotes:
-        print("\nGetting crypto quotes from Robinhood... ", end="")
-        df['quote']    = df.apply(lambda row: get_crypto_quote(row), axis=1)  # Used in get_crypto_equity() below
-        print("Done.")
-        df['quote']    = df['quote'].astype('float')
+        if crypto_quotes is None:  # Not already fetched by the caller
+            print("\nGetting crypto quotes from Robinhood... ", end="")
+            crypto_quotes = rh_fetch.get_crypto_quotes(df['ticker'].tolist())
+            print("Done.")
+        df['quote']    = df['ticker'].map(crypto_quotes).astype('float')
+        df['equity']   = df['quantity'] * df['quote']
     else:
-        df['quote'] = '?'
-    df['quantity'] = df['quantity'].astype('float')
-    df['equity']   = df.apply(lambda row: get_crypto_equity(row), axis=1)
+        df['quote']    = '?'
+        df['equity']   = '?'
     df['ticker']   = [symbol + 'USDT' for symbol in df['ticker']]
 
     df = df[['ticker', 'name', 'quantity', 'quote', 'equity', 'type']]  # Rearrange columns
@@ -166,21 +211,6 @@ def remove_USDT_from_crypto_ticker(row):
   return row
 
 
-def get_crypto_quote(row):
-
-    return robin_stocks.crypto.get_crypto_quote(row['ticker'], 'ask_price')
-
-
-def get_crypto_equity(row):
-
-    if row['quote'] != '?':
-        equity = row['quantity'] * row['quote']
-    else:
-        equity = '?'
-
-    return equity
-
-
 def process_stock_dividends_data(stock_dividends_dicts):
   
     df = pd.DataFrame(stock_dividends_dicts, index=None)
@@ -194,18 +224,71 @@ def process_positions_data(stock_positions_dicts=None, crypto_positions_dicts=No
 
     if stock_positions_dicts is None:
         stock_positions_dicts  = get_dicts_from_json_file(RH_DATA_JSON_FILE_PATH_STOCKS)
-    stock_positions_df = process_stock_positions_data(stock_positions_dicts, get_quotes)
-    stock_positions_df = prep_stock_positions_df_for_compare(stock_positions_df)
-
     if crypto_positions_dicts is None:
         crypto_positions_dicts = get_dicts_from_json_file(RH_DATA_JSON_FILE_PATH_CRYPTO)
-    crypto_positions_df = process_crypto_positions_data(crypto_positions_dicts, get_quotes)
+
+    stock_quotes  = None
+    crypto_quotes = None
+    if get_quotes:  # Get stock and crypto quotes at the same time
+        print("\nGetting stock and crypto quotes from Robinhood... ", end="")
+        stock_symbols  = list(stock_positions_dicts)  # build_holdings() keys positions by symbol
+        crypto_symbols = [position['currency']['code'] for position in crypto_positions_dicts if position['currency']['code'] != 'USD']
+        stock_quotes, crypto_quotes = asyncio.run(rh_fetch_async.get_quotes(stock_symbols, crypto_symbols))
+        print("Done.")
+
+    stock_positions_df = process_stock_positions_data(stock_positions_dicts, get_quotes, stock_quotes)
+    stock_positions_df = prep_stock_positions_df_for_compare(stock_positions_df)
+
+    crypto_positions_df = process_crypto_positions_data(crypto_positions_dicts, get_quotes, crypto_quotes)
 
     positions_df = pd.concat([stock_positions_df, crypto_positions_df])
 
     return positions_df
 
 
+def get_positions_summary(stock_positions_dicts, crypto_positions_dicts):
+
+    # (type, quantity, equity) for each position in saved position data, keyed by ticker as in process_positions_data()'s
+    # dataframe, where crypto tickers end in 'USDT'. Read straight from the dicts, so that comparing two snapshots
+    # doesn't need any dataframes. Crypto position data has no equity.
+    positions = {}
+    for ticker, position in stock_positions_dicts.items():
+        positions[ticker] = ('stock', float(position['quantity']), float(position['equity']))
+    for position in crypto_positions_dicts:
+        if position['currency']['code'] != 'USD':
+            positions[position['currency']['code'] + 'USDT'] = ('crypto', float(position['quantity']), None)
+
+    return positions
+
+
+def diff_positions(previous_positions, current_positions):
+
+    # One row for each ticker whose position was opened ('added'), closed ('removed'), or changed 'quantity' or just
+    # 'equity' between two get_positions_summary() results. Tickers that didn't change are left out.
+    rows = []
+    for ticker in sorted(set(previous_positions) | set(current_positions)):
+        previous = previous_positions.get(ticker)
+        current  = current_positions.get(ticker)
+        if previous is None:
+            change = 'added'
+        elif current is None:
+            change = 'removed'
+        elif previous[1] != current[1]:
+            change = 'quantity'
+        elif previous[2] != current[2]:
+            change = 'equity'
+        else:
+            continue
+        sec_type = (current or previous)[0]
+        rows.append((ticker, sec_type, change, previous[1] if previous else 0.0, current[1] if current else 0.0,
+                     previous[2] if previous else None, current[2] if current else None))
+
+    df = pd.DataFrame.from_records(rows, columns=POSITION_DIFF_COLUMNS)
+    df.set_index('ticker', inplace=True)
+
+    return df
+
+
 def prep_stock_positions_df_for_compare(df):
 
     columns_to_keep_in_order = ['name', 'quantity', 'equity', 'quote', 'type']
@@ -261,75 +344,291 @@ def sort_by(df, column_labels, ascending=True):
     return df
 
 
+def write_positions_to_json_files(stock_output_file_path=None, crypto_output_file_path=None):
+
+    # Fetch stock and crypto positions at the same time, for whichever output file paths are given
+    stock_positions, crypto_positions = asyncio.run(rh_fetch_async.get_positions_dicts(stock_output_file_path is not None,
+                                                                                       crypto_output_file_path is not None))
+    if stock_output_file_path is not None:
+        write_positions_snapshot(stock_positions, stock_output_file_path)
+    if crypto_output_file_path is not None:
+        write_positions_snapshot(crypto_positions, crypto_output_file_path)
+
+
 def write_stock_positions_to_json_file(output_file_path):
 
     stock_positions = rh_fetch.get_stock_positions_dicts()
-    write_to_json_file(stock_positions,  output_file_path)
+    write_positions_snapshot(stock_positions, output_file_path)
 
 
 def write_crypto_positions_to_json_file(output_file_path):
 
     crypto_positions = rh_fetch.get_crypto_positions_dicts()
-    write_to_json_file(crypto_positions, output_file_path)
+    write_positions_snapshot(crypto_positions, output_file_path)
+
+
+def write_positions_snapshot(positions, output_file_path):
+
+    print(f"Writing to {output_file_path} file... ", end="")
+    version = rh_snapshot.write_snapshot(positions, output_file_path)
+    print(f"Done. Snapshot version {version}.")
+
+
+def get_stock_orders_dicts(tickers, order_store_path=None):
+
+    if order_store_path:
+        stock_orders_dicts = rh_fetch.get_stock_orders_from_store(tickers, order_store_path)
+    else:
+        stock_orders_dicts = rh_fetch.get_stock_orders(tickers)
 
+    return stock_orders_dicts
 
-def write_stock_orders_to_csv_file(output_file_path, tickers):
 
-    stock_orders_dicts = rh_fetch.get_stock_orders(tickers)
-    stock_orders_df = process_stock_order_data(stock_orders_dicts)
+def write_stock_orders_to_csv_file(output_file_path, tickers, order_store_path=None, output_format=None):
+
+    # output_format is one of robinhood_output.OUTPUT_FORMATS, or None to go by the file extension
+    stock_orders_dicts = get_stock_orders_dicts(tickers, order_store_path)
+    write_stock_orders_outputs(stock_orders_dicts, [('table', output_file_path)], output_format)
+
+
+def write_stock_orders_to_qif_file(output_file_path, tickers, order_store_path=None, stream=False):
+
+    # An output_file_path of '-' writes to stdout, and one ending in '.gz' writes a gzip-compressed file. With stream
+    # set, records are written as orders are downloaded, in fetched order rather than sorted by date, so the whole order
+    # history never has to be held in memory. Orders from an order store are already all in memory, so they are only
+    # kept out of a dataframe.
+    if stream and not order_store_path:
+        write_streamed_qif_output_file(tickers, output_file_path)
+        return
+
+    stock_orders_dicts = get_stock_orders_dicts(tickers, order_store_path)
+    write_stock_orders_outputs(stock_orders_dicts, [('qif', output_file_path)], stream_qif=stream)
+
+
+def write_streamed_qif_output_file(tickers, output_file_path):
+
+    stock_orders = rh_fetch.iterate_stock_order_sets(tickers)
+    write_qif_output_file(iterate_stock_order_records(stock_orders), output_file_path)
+
+
+def write_stock_orders_outputs(stock_orders, outputs, output_format=None, stream_qif=False, lot_method='fifo', lot_selections=None):
+
+    # outputs is a list of ('table', path), ('qif', path), ('realized', path), and ('unrealized', path) tuples. The
+    # orders are processed into a dataframe once and written to all of them. A QIF file is only streamed when it is the
+    # only output, since otherwise the dataframe is built anyway. The realized and unrealized gains come from the same
+    # lots, so they are worked out once with robinhood_lots.get_lot_tables().
+    if stream_qif and [output_kind for output_kind, _ in outputs] == ['qif']:
+        write_qif_output_file(iterate_stock_order_records(stock_orders), outputs[0][1])
+        return
+
+    stock_orders_df = process_stock_order_data(stock_orders)
     stock_orders_df = prep_stock_order_df_for_output(stock_orders_df)
+    if any(output_kind in ['realized', 'unrealized'] for output_kind, _ in outputs):
+        print(f"\nMatching sells to lots ({lot_method})... ", end="")
+        realized_df, unrealized_df = rh_lots.get_lot_tables(stock_orders_df, lot_method, lot_selections)
+        print("Done.")
+
+    for output_kind, output_file_path in outputs:
+        if output_kind == 'qif':
+            order_records = stock_orders_df[STOCK_ORDER_COLUMNS].itertuples(index=False, name=None)
+            write_qif_output_file(order_records, output_file_path)
+        elif output_kind == 'realized':
+            write_realized_gains_file(realized_df, output_file_path, output_format)
+        elif output_kind == 'unrealized':
+            write_unrealized_gains_file(unrealized_df, output_file_path, output_format)
+        else:
+            write_output_file(stock_orders_df, output_file_path, rh_output.STOCK_ORDER_DTYPES, False, output_format)
+
+
+def write_realized_gains_file(realized_df, output_file_path, output_format=None):
+
+    is_long_term = realized_df['term'] == 'long'
+    print(f"\nRealized gains: ${realized_df.loc[~is_long_term, 'gain'].sum():,.2f} short term, "
+          f"${realized_df.loc[is_long_term, 'gain'].sum():,.2f} long term, {realized_df['wash_sale'].sum()} possible wash "
+          f"sales, {realized_df['acquired'].isna().sum()} sells without matching buys.")
+    write_output_file(realized_df, output_file_path, rh_output.REALIZED_GAIN_DTYPES, False, output_format)
 
-    print(f"\nWriting CSV output to {output_file_path} file... ", end="")
-    stock_orders_df.to_csv(output_file_path, index=False)
+
+def write_unrealized_gains_file(unrealized_df, output_file_path, output_format=None):
+
+    print("\nGetting stock quotes from Robinhood... ", end="")
+    stock_quotes = rh_fetch.get_stock_quotes(unrealized_df['ticker'].unique().tolist())
     print("Done.")
+    unrealized_df = rh_lots.add_quotes_to_unrealized_df(unrealized_df, stock_quotes)
 
+    print(f"\nUnrealized gains: ${unrealized_df['gain'].sum():,.2f} on {len(unrealized_df):,} open lots.")
+    write_output_file(unrealized_df, output_file_path, rh_output.UNREALIZED_GAIN_DTYPES, False, output_format)
 
-def write_stock_orders_to_qif_file(output_file_path, tickers):
 
-    stock_orders_dicts = rh_fetch.get_stock_orders(tickers)
-    stock_orders_df = process_stock_order_data(stock_orders_dicts)
-    stock_orders_df = prep_stock_order_df_for_output(stock_orders_df)
+def write_qif_output_file(order_records, output_file_path):
 
     print(f"\nWriting QIF output to {output_file_path} file... ", end="")
-    # See https://www.w3.org/2000/10/swap/pim/qif-doc/QIF-doc.htm for QIF format
-    with open(output_file_path, 'w') as qif_file:
-        qif_file.write("!Account\nNRobinhood\nTInvst\n^\n")
-        for index, order in stock_orders_df.iterrows():
-            qif_file.write(f"!Type:Invst\n"
-                            f"D{order['datetime']}\n"
-                            f"N{order['side']}\n"
-                            f"Y{order['ticker']}\n"
-                            f"I{order['price']}\n"
-                            f"Q{order['quantity']}\n"
-                            f"T{order['amount']}\n"
-                            f"O-{order['fees/commission']}\n"
-                            f"Cc\n"  # Cleared status (?)
-                            f"P{order['ticker']} {order['side']}\n"  # Ex: PAAPL Buy
-                            f"M{order['ticker']} {order['side']}\n"  # Ex: MAAPL Buy
-                            f"^\n")
-        qif_file.write("^")
+    with open_output_file(output_file_path) as qif_file:
+        write_stock_order_records_to_qif(order_records, qif_file)
     print("Done.")
 
 
-def write_stock_positions_to_csv_file(output_file_path):
+def write_stock_order_records_to_qif(order_records, qif_file, chunk_size=QIF_CHUNK_SIZE):
+
+    # order_records is an iterable of tuples with the STOCK_ORDER_COLUMNS values. Records are formatted and joined in
+    # chunks so that there is one write call per chunk rather than one per record.
+    # See https://www.w3.org/2000/10/swap/pim/qif-doc/QIF-doc.htm for QIF format
+    qif_file.write("!Account\nNRobinhood\nTInvst\n^\n")
+    chunk = []
+    for (ticker, datetime_str, side, order_type, execution_number, num_executions, quantity, price, amount, fees) in order_records:
+        chunk.append(f"!Type:Invst\n"
+                     f"D{datetime_str}\n"
+                     f"N{side}\n"
+                     f"Y{ticker}\n"
+                     f"I{price}\n"
+                     f"Q{quantity}\n"
+                     f"T{amount}\n"
+                     f"O-{fees}\n"
+                     f"Cc\n"  # Cleared status (?)
+                     f"P{ticker} {side}\n"  # Ex: PAAPL Buy
+                     f"M{ticker} {side}\n"  # Ex: MAAPL Buy
+                     f"^\n")
+        if len(chunk) == chunk_size:
+            qif_file.write(''.join(chunk))
+            chunk = []
+    qif_file.write(''.join(chunk))
+    qif_file.write("^")
+
+
+def open_output_file(output_file_path):
+
+    if output_file_path == '-':
+        return contextlib.nullcontext(STDOUT)  # Don't close stdout when done
+    elif output_file_path.endswith('.gz'):
+        return gzip.open(output_file_path, 'wt')
+    else:
+        return open(output_file_path, 'w')
+
+
+def write_stock_positions_to_csv_file(output_file_path, output_format=None):
 
     stock_positions_dicts = rh_fetch.get_stock_positions_dicts()
+    write_stock_positions_outputs(stock_positions_dicts, [('table', output_file_path)], output_format)
+
+
+def write_stock_positions_outputs(stock_positions_dicts, outputs, output_format=None):
+
     stock_positions_df = process_stock_positions_data(stock_positions_dicts)
     stock_positions_df = prep_stock_positions_df_for_output(stock_positions_df)
 
-    print(f"Writing CSV output to {output_file_path} file... ", end="")
-    stock_positions_df.to_csv(output_file_path, index=True)  # Index is the ticker symbol, include it in output
-    print("Done.")
+    for _, output_file_path in outputs:
+        # Index is the ticker symbol, include it in output
+        write_output_file(stock_positions_df, output_file_path, rh_output.STOCK_POSITION_DTYPES, True, output_format)
 
 
-def write_stock_dividends_to_csv_file(output_file_path):
+def write_stock_dividends_to_csv_file(output_file_path, output_format=None):
 
     stock_dividends_dicts = rh_fetch.get_stock_dividends_dicts()
+    write_stock_dividends_outputs(stock_dividends_dicts, [('table', output_file_path)], output_format)
+
+
+def write_stock_dividends_outputs(stock_dividends_dicts, outputs, output_format=None, stock_positions_dicts=None):
+
+    # outputs is a list of ('table', path) and ('analytics', path) tuples. 'analytics' writes the per-symbol and
+    # per-month dividend income summaries next to path. stock_positions_dicts is only used for yield on cost.
     stock_dividends_df = process_stock_dividends_data(stock_dividends_dicts)
+    if any(output_kind == 'analytics' for output_kind, _ in outputs):
+        dividends_df = rh_dividends.prepare_dividends_df(stock_dividends_df)  # Before prep_stock_dividends_df_for_output() drops columns
     stock_dividends_df = prep_stock_dividends_df_for_output(stock_dividends_df)
 
-    print(f"Writing CSV output to {output_file_path} file... ", end="")
-    stock_dividends_df.to_csv(output_file_path, index=False)
+    for output_kind, output_file_path in outputs:
+        if output_kind == 'analytics':
+            write_dividend_analytics_files(dividends_df, output_file_path, output_format, stock_positions_dicts)
+        else:
+            write_output_file(stock_dividends_df, output_file_path, rh_output.STOCK_DIVIDEND_DTYPES, False, output_format)
+
+
+def write_dividend_analytics_files(dividends_df, output_file_path, output_format=None, stock_positions_dicts=None):
+
+    dividend_totals = rh_dividends.get_dividend_totals(dividends_df)
+    print(f"\nDividend income: ${dividend_totals['amount']:,.2f} total, ${dividend_totals['ttm_amount']:,.2f} over the "
+          f"last {rh_dividends.TRAILING_MONTHS} months, ${dividend_totals['withholding']:,.2f} withheld.")
+
+    by_symbol_df = rh_dividends.get_dividends_by_symbol(dividends_df, stock_positions_dicts)
+    write_output_file(by_symbol_df, rh_output.add_file_name_suffix(output_file_path, '_by_symbol'),
+                      rh_output.DIVIDEND_BY_SYMBOL_DTYPES, True, output_format)
+
+    by_month_df = rh_dividends.get_dividends_by_month(dividends_df)
+    write_output_file(by_month_df, rh_output.add_file_name_suffix(output_file_path, '_by_month'),
+                      rh_output.DIVIDEND_BY_MONTH_DTYPES, True, output_format)
+
+
+def plan_outputs(args):
+
+    # Group the requested outputs by the dataset they are made from, so that each dataset is fetched and processed only
+    # once no matter how many outputs use it
+    output_plan = {}
+    if args.stock_ord_csv_path:
+        output_plan.setdefault('stock_orders', []).append(('table', args.stock_ord_csv_path))
+    if args.stock_ord_qif_path:
+        output_plan.setdefault('stock_orders', []).append(('qif', args.stock_ord_qif_path))
+    if args.realized_gains_path:
+        output_plan.setdefault('stock_orders', []).append(('realized', args.realized_gains_path))
+    if args.unrealized_gains_path:
+        output_plan.setdefault('stock_orders', []).append(('unrealized', args.unrealized_gains_path))
+    if args.stock_pos_csv_path:
+        output_plan.setdefault('stock_positions', []).append(('table', args.stock_pos_csv_path))
+    if args.stock_div_csv_path:
+        output_plan.setdefault('stock_dividends', []).append(('table', args.stock_div_csv_path))
+    if args.dividend_analytics:
+        output_plan.setdefault('stock_dividends', []).append(('analytics', args.stock_div_csv_path))
+
+    return output_plan
+
+
+async def fetch_datasets(datasets, tickers=None, order_store_path=None):
+
+    # Fetch the datasets at the same time, since none of them depends on another. Returns a dictionary keyed by dataset.
+    fetches = []
+    for dataset in datasets:
+        if dataset == 'stock_orders':
+            fetches.append(rh_fetch_async.run_blocking(get_stock_orders_dicts, tickers, order_store_path))
+        elif dataset == 'stock_positions':
+            fetches.append(rh_fetch_async.get_stock_positions_dicts())
+        elif dataset == 'stock_dividends':
+            fetches.append(rh_fetch_async.get_stock_dividends_dicts())
+
+    return dict(zip(datasets, await asyncio.gather(*fetches)))
+
+
+def run_output_plan(output_plan, tickers=None, order_store_path=None, output_format=None, stream_qif=False, lot_method='fifo',
+                    lot_selections=None):
+
+    # A QIF file that is the only stock order output is written as the order history downloads, instead of from orders
+    # fetched up front. Orders from an order store are all read at once anyway.
+    stream_orders = (stream_qif and not order_store_path
+                     and [output_kind for output_kind, _ in output_plan.get('stock_orders', [])] == ['qif'])
+    datasets_to_fetch = [dataset for dataset in output_plan if not (stream_orders and dataset == 'stock_orders')]
+
+    # Dividend analytics also need the stock positions, for yield on cost
+    if any(output_kind == 'analytics' for output_kind, _ in output_plan.get('stock_dividends', [])):
+        if 'stock_positions' not in datasets_to_fetch:
+            datasets_to_fetch.append('stock_positions')
+
+    datasets = asyncio.run(fetch_datasets(datasets_to_fetch, tickers, order_store_path))
+
+    # Writing is left until everything is fetched, so that status messages for each file don't get mixed together
+    for dataset, outputs in output_plan.items():
+        if dataset == 'stock_orders' and stream_orders:
+            write_streamed_qif_output_file(tickers, outputs[0][1])
+        elif dataset == 'stock_orders':
+            write_stock_orders_outputs(datasets[dataset], outputs, output_format, stream_qif, lot_method, lot_selections)
+        elif dataset == 'stock_positions':
+            write_stock_positions_outputs(datasets[dataset], outputs, output_format)
+        elif dataset == 'stock_dividends':
+            write_stock_dividends_outputs(datasets[dataset], outputs, output_format, datasets.get('stock_positions'))
+
+
+def write_output_file(df, output_file_path, dtypes, index=False, output_format=None):
+
+    output_format = rh_output.get_output_format(output_file_path, output_format)
+    print(f"\nWriting {output_format.upper()} output to {output_file_path} file... ", end="")
+    rh_output.write_df(df, output_file_path, dtypes, index, output_format)
     print("Done.")
 
 
@@ -359,15 +658,29 @@ def json_to_dict(json_input):
 
 def parse_and_check_input():
 
-  parser = argparse.ArgumentParser(description='Output CSV file(s) with Robinhood order, position, or dividend information, or QIF files with order information.')
+  parser = argparse.ArgumentParser(description='Output CSV file(s) with Robinhood order, position, or dividend information, or QIF files with order information. '
+                                   'Order, position, and dividend data can also be written as Parquet, Feather, or gzip-compressed CSV, chosen by the file extension or --output_format.')
   parser.add_argument('--stock_ord_csv_path', '-so')
-  parser.add_argument('--stock_ord_qif_path', '-so_qif')
+  parser.add_argument('--stock_ord_qif_path', '-so_qif', help="Use '-' to write to stdout, or a path ending in '.gz' to write a gzip-compressed file.")
+  parser.add_argument('--realized_gains_path', '-rg', help='Write one row for each lot (or part of a lot) sold, with its proceeds, cost basis, gain, holding term, and whether it may be a wash sale. Uses the orders for --tickers.')
+  parser.add_argument('--unrealized_gains_path', '-ug', help='Write one row for each lot still held, with its cost basis and its gain at the current quote. Uses the orders for --tickers.')
+  parser.add_argument('--lot_method', choices=rh_lots.LOT_METHODS, default='fifo', help='How sells are matched to the lots they came from: first in first out, last in first out, highest cost first, specific lots from --lot_selections, or average cost. Defaults to fifo.')
+  parser.add_argument('--lot_selections', help='JSON file giving the lots to sell from for each sell, for --lot_method specific. See robinhood_lots.get_lot_selections() for the format.')
   parser.add_argument('--stock_pos_csv_path', '-sp')
   parser.add_argument('--stock_div_csv_path', '-sd')
+  parser.add_argument('--dividend_analytics', action='store_true', help='Also write dividend income by symbol (with trailing 12 month income and yield on cost) and by month to files next to the stock_div_csv_path file, with "_by_symbol" and "_by_month" added to the name.')
+  parser.add_argument('--output_format', '-f', choices=rh_output.OUTPUT_FORMATS, help="Format for the -so, -sp, -sd, -rg, and -ug files. Defaults to going by each file's extension (.csv, .csv.gz, .parquet, .feather), or CSV if it isn't one of those. Parquet and Feather need the pyarrow package.")
   parser.add_argument('--tickers', '-t', nargs='+', help='Space-separated list of tickers to get stock order data for. Only used when stock_ord_csv_path is specified.')
+  parser.add_argument('--stream_qif', action='store_true', help='Write QIF records as orders are downloaded instead of sorting them by date first. Uses less memory for large order histories. With --order_store_path, the stored orders are read at once but still not sorted. Ignored when -so is also given.')
+  parser.add_argument('--metrics_json', help='Write request counts, times, retries, and response sizes for each Robinhood endpoint to this JSON file at exit.')
+  parser.add_argument('--metrics_prometheus', help='Same as --metrics_json, in Prometheus text format.')
+  parser.add_argument('--record', help='Save every response from Robinhood to this JSON file, to replay later with --replay.')
+  parser.add_argument('--replay', help='Answer requests from a file saved with --record instead of logging in to Robinhood.')
+  parser.add_argument('--order_store_path', '-os', help='SQLite file to keep a local copy of the stock order history in. When given, only orders that are new or updated since the last run are downloaded.')
   args = parser.parse_args()
 
-  if (not args.stock_ord_csv_path and not args.stock_ord_qif_path and not args.stock_pos_csv_path and not args.stock_div_csv_path):
+  if (not args.stock_ord_csv_path and not args.stock_ord_qif_path and not args.stock_pos_csv_path and not args.stock_div_csv_path
+      and not args.realized_gains_path and not args.unrealized_gains_path):
     print(f"No output specified.\n")
     parser.print_help()
     sys.exit(f"\nExiting.\n")
@@ -377,28 +690,53 @@ def parse_and_check_input():
     parser.print_help()
     sys.exit(f"\nExiting.\n")
 
+  if args.dividend_analytics and not args.stock_div_csv_path:
+    sys.exit(f"--dividend_analytics needs --stock_div_csv_path to say where to write the files.\nExiting.\n")
+
+  if (args.realized_gains_path or args.unrealized_gains_path) and not args.tickers:
+    sys.exit(f"--realized_gains_path and --unrealized_gains_path need --tickers to say which orders to use.\nExiting.\n")
+
+  if args.lot_selections and args.lot_method != 'specific':
+    sys.exit(f"--lot_selections is only used with --lot_method specific.\nExiting.\n")
+
+  for output_file_path in [args.stock_ord_csv_path, args.stock_pos_csv_path, args.stock_div_csv_path, args.realized_gains_path,
+                           args.unrealized_gains_path]:
+    if output_file_path:
+      try:
+        rh_output.check_output_format_available(rh_output.get_output_format(output_file_path, args.output_format))
+      except ImportError as e:
+        sys.exit(f"{e}\nExiting.\n")
+
   return args
 
 
 def main():
 
+  args = parse_and_check_input()
+
+  if args.stock_ord_qif_path == '-':
+    sys.stdout = sys.stderr  # Keep status messages out of the QIF output
+
   print()
 
-  args = parse_and_check_input()
+  if args.metrics_json or args.metrics_prometheus:
+    rh_metrics.enable(args.metrics_json, args.metrics_prometheus)
 
-  rh_fetch.login()
+  if args.replay:
+    rh_replay.start_replay(args.replay)
 
-  if (args.stock_ord_csv_path):
-    write_stock_orders_to_csv_file(args.stock_ord_csv_path, args.tickers)
+  rh_fetch.login()  # Does nothing when replaying
 
-  if (args.stock_ord_qif_path):
-    write_stock_orders_to_qif_file(args.stock_ord_qif_path, args.tickers)
+  if args.record:
+    rh_replay.start_recording(args.record)  # After logging in, so that tokens aren't saved
 
-  if (args.stock_pos_csv_path):
-    write_stock_positions_to_csv_file(args.stock_pos_csv_path)
-  
-  if (args.stock_div_csv_path):
-    write_stock_dividends_to_csv_file(args.stock_div_csv_path)
+  lot_selections = None
+  if args.lot_selections:
+    lot_selections = rh_lots.get_lot_selections(get_dicts_from_json_file(args.lot_selections))
+
+  output_plan = plan_outputs(args)
+  run_output_plan(output_plan, args.tickers, args.order_store_path, args.output_format, args.stream_qif, args.lot_method,
+                  lot_selections)
 
 
 if __name__ == '__main__':
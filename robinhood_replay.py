@@ -0,0 +1,104 @@
+import json
+import atexit
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import requests
+import robin_stocks
+
+# Local modules and files:
+import robinhood_session as rh_session
+
+
+# Record the responses to every request made to Robinhood during a run, and replay them later without credentials or a
+# network connection. Like robinhood_metrics, recording is a response hook on robin_stocks' shared requests session.
+# Replaying mounts an adapter on that session that answers each request from the recording. Recording starts after
+# logging in, so login requests and their tokens are never saved.
+
+
+def get_request_key(method, url):
+
+    # Query parameters are sorted so that the same request always gets the same key
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+
+    return f"{method} {urlunsplit((parts.scheme, parts.netloc, parts.path, query, ''))}"
+
+
+def make_response(request, status_code, data):
+
+    response = requests.Response()
+    response.status_code = status_code
+    response._content    = json.dumps(data).encode()
+    response.encoding    = 'utf-8'
+    response.headers['Content-Type'] = 'application/json'
+    response.url         = request.url
+    response.request     = request
+
+    return response
+
+
+class Recorder:
+  # Keeps a list of responses for each request key, since the same request can get different responses during a run
+  # (e.g. syncing the order store before and after new orders)
+
+  def __init__(self):
+    self.responses = {}
+    self.lock      = threading.Lock()
+
+  def record_response(self, response, *args, **kwargs):
+    # requests response hook
+    try:
+      data = response.json()
+    except ValueError:
+      data = None
+    key = get_request_key(response.request.method, response.url)
+    with self.lock:
+      self.responses.setdefault(key, []).append([response.status_code, data])
+
+  def save(self, file_path):
+    with self.lock:
+      with open(file_path, "w") as recording_file:
+        json.dump(self.responses, recording_file)
+
+
+class ReplayAdapter(requests.adapters.BaseAdapter):
+  # Answers requests in the order they were recorded. Once a request's recorded responses run out, the last one is
+  # repeated. Requests that weren't recorded get a 404.
+
+  def __init__(self, responses):
+    super().__init__()
+    self.responses   = responses
+    self.num_replays = {}
+    self.lock        = threading.Lock()
+
+  def send(self, request, **kwargs):
+    key = get_request_key(request.method, request.url)
+    with self.lock:
+      recorded_responses = self.responses.get(key)
+      if not recorded_responses:
+        return make_response(request, 404, {'detail': f"No recorded response for {key}"})
+      replay_idx = min(self.num_replays.get(key, 0), len(recorded_responses) - 1)
+      self.num_replays[key] = replay_idx + 1
+    status_code, data = recorded_responses[replay_idx]
+    return make_response(request, status_code, data)
+
+  def close(self):
+    pass
+
+
+def start_recording(recording_file_path):
+
+    # Record from now on, and save the recording at exit
+    recorder = Recorder()
+    robin_stocks.helper.SESSION.hooks['response'].append(recorder.record_response)
+    atexit.register(recorder.save, recording_file_path)
+
+    return recorder
+
+
+def start_replay(recording_file_path):
+
+    with open(recording_file_path, "r") as recording_file:
+        responses = json.load(recording_file)
+
+    rh_session.use_offline_adapter(ReplayAdapter(responses))
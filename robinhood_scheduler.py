@@ -0,0 +1,82 @@
+REQUESTS_PER_SECOND = 5
+REQUEST_BURST = 10
+MAX_WORKERS = 4
+MAX_RETRIES = 4
+RETRY_BACKOFF_SECONDS = 1  # Doubled after each retry
+RETRYABLE_STATUS_CODES = [429, 500, 502, 503, 504]
+
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Local modules and files:
+import robinhood_metrics as rh_metrics
+
+
+class TokenBucket:
+  # Rate limiter shared by worker threads. Tokens are added at `rate` per second up to `capacity`, and each request
+  # takes one token, waiting for one to become available if necessary.
+
+  def __init__(self, rate=REQUESTS_PER_SECOND, capacity=REQUEST_BURST):
+    self.rate        = rate
+    self.capacity    = capacity
+    self.tokens      = capacity
+    self.last_refill = time.monotonic()
+    self.lock        = threading.Lock()
+
+  def acquire(self):
+    while True:
+      with self.lock:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+        if self.tokens >= 1:
+          self.tokens -= 1
+          return
+        wait_time = (1 - self.tokens) / self.rate
+      time.sleep(wait_time)
+
+
+def get_status_code(exception):
+
+    # requests.HTTPError keeps the response it was raised for; other exceptions have no status code
+    response = getattr(exception, 'response', None)
+
+    return getattr(response, 'status_code', None)
+
+
+def call_with_retry(func, *args, rate_limiter=None, max_retries=MAX_RETRIES, backoff_seconds=RETRY_BACKOFF_SECONDS):
+
+    # Call func(*args), retrying with exponential backoff when the request is rate limited (429) or hits a server
+    # error (5xx). Any other exception is raised immediately.
+    for attempt in range(max_retries + 1):
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        try:
+            return func(*args)
+        except Exception as e:
+            if attempt == max_retries or get_status_code(e) not in RETRYABLE_STATUS_CODES:
+                raise
+            if rh_metrics.METRICS is not None:
+                rh_metrics.METRICS.record_retry(e)
+        time.sleep(backoff_seconds * 2**attempt)
+
+
+def run_in_pool(func, items, max_workers=MAX_WORKERS, rate_limiter=None):
+
+    # Call func(item) for each item on a bounded thread pool. Returns a list of (result, exception) tuples in the same
+    # order as items, so one failing item doesn't stop the others.
+    if rate_limiter is None:
+        rate_limiter = TokenBucket()
+
+    def call(item):
+        try:
+            return (call_with_retry(func, item, rate_limiter=rate_limiter), None)
+        except Exception as e:
+            return (None, e)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(call, items))
+
+    return results
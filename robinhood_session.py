@@ -0,0 +1,167 @@
+TOKEN_CACHE_FILE_NAME = "robinhood_api_token_{}.json"  # Kept in ~/.tokens, where robin_stocks keeps its own session file
+TOKEN_EXPIRES_IN_SECONDS = 24*60*60  # Lifetime requested for new tokens
+TOKEN_REFRESH_MARGIN_SECONDS = 60*60  # Refresh tokens that expire within this long instead of waiting for them to fail
+HTTP_POOL_SIZE = 16  # Enough connections for the thread pools used when fetching
+ROBINHOOD_CLIENT_ID = 'c82SH0WZOsabOXGP2sxqcj34FxkvfnWRZBKlBjFS'  # Same client ID robin_stocks logs in with
+
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+import contextlib
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+from lazy_import import lazy_import
+pyotp        = lazy_import('pyotp')
+robin_stocks = lazy_import('robin_stocks')
+requests     = lazy_import('requests')
+
+
+# Logging in with a password and TOTP code takes several seconds, so the OAuth token from a login is saved and reused by
+# later runs until it is close to expiring or is rejected. It is then refreshed with the refresh token, and a full login
+# is only done if there is no usable token. All requests share robin_stocks' single requests session, which is given a
+# connection pool large enough for concurrent fetches.
+
+OFFLINE = False  # Set by use_offline_adapter(), when responses come from a recording or the fake API instead of Robinhood
+
+
+def get_token_cache_file_path(username):
+
+    # One file per account, so that logging in to one account doesn't replace another's token
+    username_hash = hashlib.sha256(username.encode()).hexdigest()[:16]
+
+    return os.path.join(os.path.expanduser('~'), '.tokens', TOKEN_CACHE_FILE_NAME.format(username_hash))
+
+
+def load_cached_token(username):
+
+    try:
+        with open(get_token_cache_file_path(username), "r") as token_file:
+            token = json.load(token_file)
+    except (OSError, ValueError):
+        return None
+
+    if token.get('username') != username:  # Saved for a different account
+        return None
+
+    return token
+
+
+def save_cached_token(username, login_data):
+
+    # Returns None, without replacing the saved token, if the login or refresh didn't give a token
+    if not login_data or 'access_token' not in login_data:
+        return None
+
+    token = {'username':      username,
+             'token_type':    login_data['token_type'],
+             'access_token':  login_data['access_token'],
+             'refresh_token': login_data.get('refresh_token'),
+             'expires_at':    time.time() + login_data.get('expires_in', TOKEN_EXPIRES_IN_SECONDS)}
+
+    token_file_path = get_token_cache_file_path(username)
+    os.makedirs(os.path.dirname(token_file_path), exist_ok=True)
+    # A uniquely named temporary file, so that workers saving a token at the same time can't write to the same one.
+    # mkstemp() creates it only readable by the user.
+    file_dir, file_name = os.path.split(token_file_path)
+    file_descriptor, temp_file_path = tempfile.mkstemp(prefix=file_name + ".", suffix=".tmp", dir=file_dir)
+    try:
+        with os.fdopen(file_descriptor, "w") as token_file:
+            json.dump(token, token_file)
+        os.replace(temp_file_path, token_file_path)
+    except BaseException:
+        os.remove(temp_file_path)
+        raise
+
+    return token
+
+
+@contextlib.contextmanager
+def lock_cached_token(username):
+
+    # Held while an account's saved token is checked, refreshed, or replaced, so that batch workers logging in to the
+    # same account at the same time wait for the first one's token instead of each refreshing it or doing a full login.
+    # Logins aren't serialized where fcntl isn't available.
+    lock_file_path = get_token_cache_file_path(username) + ".lock"
+    os.makedirs(os.path.dirname(lock_file_path), exist_ok=True)
+    with open(lock_file_path, "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)  # Released when the file is closed
+        yield
+
+
+def use_token(token):
+
+    robin_stocks.helper.update_session('Authorization', f"{token['token_type']} {token['access_token']}")
+    robin_stocks.helper.set_login_state(True)
+
+
+def is_token_accepted(token):
+
+    # A token can be revoked, or a saved one can be out of date, before it expires, so make one cheap authenticated
+    # request with it, as robin_stocks does when it reuses its own saved session
+    use_token(token)
+    response = robin_stocks.helper.SESSION.get(robin_stocks.urls.portfolio_profile())
+    if response.status_code == 401:
+        robin_stocks.helper.update_session('Authorization', None)
+        robin_stocks.helper.set_login_state(False)
+        return False
+
+    return True
+
+
+def refresh_token(username, token):
+
+    payload = {'grant_type':    'refresh_token',
+               'refresh_token': token['refresh_token'],
+               'client_id':     ROBINHOOD_CLIENT_ID,
+               'scope':         'internal',
+               'expires_in':    TOKEN_EXPIRES_IN_SECONDS}
+    login_data = robin_stocks.helper.request_post(robin_stocks.urls.login_url(), payload)
+
+    return save_cached_token(username, login_data)
+
+
+def configure_http_session():
+
+    adapter = requests.adapters.HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+    robin_stocks.helper.SESSION.mount('https://', adapter)
+
+
+def use_offline_adapter(adapter):
+
+    # Answer every request from adapter instead of the network, and skip logging in
+    global OFFLINE
+    OFFLINE = True
+    robin_stocks.helper.SESSION.mount('https://', adapter)
+    robin_stocks.helper.set_login_state(True)  # robin_stocks refuses some calls when not logged in
+
+
+def login(username, password, totp_secret):
+
+    if OFFLINE:
+        return
+
+    configure_http_session()
+
+    with lock_cached_token(username):
+        token = load_cached_token(username)
+
+        if token is not None and (token['expires_at'] - time.time() < TOKEN_REFRESH_MARGIN_SECONDS
+                                  or not is_token_accepted(token)):
+            token = refresh_token(username, token)
+
+        if token is None:
+            totp       = pyotp.TOTP(totp_secret).now()
+            login_data = robin_stocks.login(username, password, expiresIn=TOKEN_EXPIRES_IN_SECONDS,
+                                            store_session=False, mfa_code=totp)
+            token      = save_cached_token(username, login_data)
+            if token is None:
+                detail = (login_data or {}).get('detail', "no token was returned")
+                raise RuntimeError(f"Could not log in to Robinhood: {detail}")
+
+    use_token(token)
@@ -0,0 +1,138 @@
+SNAPSHOT_VERSIONS_TO_KEEP = 10
+
+
+import os
+import json
+import time
+import glob
+import hashlib
+import tempfile
+
+
+# A snapshot is a JSON data file (e.g. robinhood_stock_positions.json) plus a metadata file next to it recording when
+# the data was fetched and a hash of its contents. Each time the contents change, a copy is also kept as a numbered
+# version (e.g. robinhood_stock_positions.v3.json) so that earlier snapshots can be compared against. The metadata also
+# records which version was current before the latest fetch, for read_previous_snapshot().
+
+
+def get_metadata_file_path(file_path):
+
+    return file_path + ".meta"
+
+
+def get_version_file_path(file_path, version):
+
+    base, extension = os.path.splitext(file_path)
+
+    return f"{base}.v{version}{extension}"
+
+
+def write_file_atomically(file_path, contents):
+
+    # Write to a temporary file and rename it over the destination, so readers never see a half-written file. The
+    # temporary file is uniquely named, so that processes writing the same snapshot at the same time can't use the
+    # same one.
+    file_dir, file_name = os.path.split(os.path.abspath(file_path))
+    temp_fd, temp_file_path = tempfile.mkstemp(prefix=file_name + ".", suffix=".tmp", dir=file_dir)
+    try:
+        with os.fdopen(temp_fd, "w") as temp_file:
+            temp_file.write(contents)
+        os.replace(temp_file_path, file_path)
+    except BaseException:
+        os.remove(temp_file_path)
+        raise
+
+
+def read_snapshot_metadata(file_path):
+
+    try:
+        with open(get_metadata_file_path(file_path), "r") as metadata_file:
+            return json.load(metadata_file)
+    except (OSError, ValueError):
+        return None
+
+
+def get_snapshot_age(file_path):
+
+    # Seconds since the snapshot was fetched, or None if there is no snapshot. Snapshots written before metadata was
+    # kept fall back to the data file's modification time.
+    if not os.path.exists(file_path):
+        return None
+
+    metadata = read_snapshot_metadata(file_path)
+    if metadata is not None:
+        fetched_at = metadata['fetched_at']
+    else:
+        fetched_at = os.path.getmtime(file_path)
+
+    return time.time() - fetched_at
+
+
+def snapshot_is_fresh(file_path, max_age_seconds):
+
+    age = get_snapshot_age(file_path)
+
+    return age is not None and age <= max_age_seconds
+
+
+def write_snapshot(data, file_path, versions_to_keep=SNAPSHOT_VERSIONS_TO_KEEP):
+
+    contents = json.dumps(data)
+    content_hash = hashlib.sha256(contents.encode()).hexdigest()
+
+    metadata = read_snapshot_metadata(file_path) or {'version': 0, 'sha256': None}
+    metadata['previous_version'] = metadata['version']  # Stays the same as 'version' if the contents haven't changed
+    if content_hash != metadata['sha256'] or not os.path.exists(file_path):
+        metadata['version'] += 1
+        metadata['sha256'] = content_hash
+        write_file_atomically(get_version_file_path(file_path, metadata['version']), contents)
+        write_file_atomically(file_path, contents)
+        remove_old_snapshot_versions(file_path, metadata['version'] - versions_to_keep + 1)
+    metadata['fetched_at'] = time.time()  # Refreshed even when the contents haven't changed
+    write_file_atomically(get_metadata_file_path(file_path), json.dumps(metadata))
+
+    return metadata['version']
+
+
+def read_snapshot(file_path, version=None):
+
+    if version is not None:
+        file_path = get_version_file_path(file_path, version)
+
+    with open(file_path, "r") as snapshot_file:
+        data = json.load(snapshot_file)
+
+    return data
+
+
+def read_previous_snapshot(file_path):
+
+    # The snapshot that was current before the latest write_snapshot(), which has the same contents as the current one
+    # if nothing changed. None if there isn't one, e.g. after the first fetch, or if its version file has been removed.
+    metadata = read_snapshot_metadata(file_path)
+    if metadata is None or not metadata.get('previous_version'):
+        return None
+
+    try:
+        return read_snapshot(file_path, metadata['previous_version'])
+    except (OSError, ValueError):
+        return None
+
+
+def get_snapshot_versions(file_path):
+
+    base, extension = os.path.splitext(file_path)
+    versions = []
+    for version_file_path in glob.glob(glob.escape(base) + ".v*" + extension):
+        version_str = version_file_path[len(base)+2:len(version_file_path)-len(extension)]
+        if version_str.isdigit():
+            versions.append(int(version_str))
+
+    return sorted(versions)
+
+
+def remove_old_snapshot_versions(file_path, oldest_version_to_keep):
+
+    for version in get_snapshot_versions(file_path):
+        if version < oldest_version_to_keep:
+            os.remove(get_version_file_path(file_path, version))